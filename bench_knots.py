@@ -0,0 +1,145 @@
+"""Headless frame-time benchmark for KnotDisplay.
+
+Runs the screensaver simulation and rendering on an off-screen surface
+under SDL's dummy video driver and sweeps the number of knots, base points
+per knot and smoothing steps. Every case reports p50/p95/p99 frame times
+split into the simulate, smooth and draw phases as JSON:
+
+    python bench_knots.py --knots 1 50 200 --points 5 20 --steps 10 35 \\
+        --output bench.json
+    python bench_knots.py --baseline bench.json --threshold 0.2
+
+With --baseline the run exits with status 1 when the p95 frame time of
+any case grew by more than the threshold.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from refact_Konstantinov import SCREEN_DIM, ArrayKnot, Knot, KnotDisplay
+
+PHASES = ("simulate", "smooth", "draw", "frame")
+KNOT_CLASSES = {"array": ArrayKnot, "list": Knot}
+
+
+def build_display(surface, knots, points, rng, knot_class=ArrayKnot):
+    knot_display = KnotDisplay(display=surface)
+    for _ in range(knots):
+        knot = knot_class(surface)
+        for _ in range(points):
+            knot.add_point((rng.random() * SCREEN_DIM[0], rng.random() * SCREEN_DIM[1]),
+                           (rng.random() * 2, rng.random() * 2), count=0)
+        knot_display.add_knot(knot)
+    return knot_display
+
+
+def summarize(samples):
+    ms = np.asarray(samples) * 1000
+    return {"p50": float(np.percentile(ms, 50)),
+            "p95": float(np.percentile(ms, 95)),
+            "p99": float(np.percentile(ms, 99)),
+            "mean": float(ms.mean())}
+
+
+def run_case(knots, points, steps, frames=200, warmup=20, seed=0, knot_class=ArrayKnot):
+    surface = pygame.Surface(SCREEN_DIM)
+    knot_display = build_display(surface, knots, points, random.Random(seed), knot_class)
+    timings = {phase: [] for phase in PHASES}
+    clock = time.perf_counter
+    for frame in range(warmup + frames):
+        t0 = clock()
+        knot_display.move_all()
+        t1 = clock()
+        knot_display.smooth_all(count=steps)
+        t2 = clock()
+        knot_display.draw_all(count=steps)
+        t3 = clock()
+        if frame >= warmup:
+            timings["simulate"].append(t1 - t0)
+            timings["smooth"].append(t2 - t1)
+            timings["draw"].append(t3 - t2)
+            timings["frame"].append(t3 - t0)
+    return {"knots": knots, "points": points, "steps": steps, "frames": frames,
+            "phases": {phase: summarize(timings[phase]) for phase in PHASES}}
+
+
+def case_key(case):
+    return case["knots"], case["points"], case["steps"]
+
+
+def find_regressions(results, baseline, threshold):
+    previous = {case_key(case): case for case in baseline["results"]}
+    regressions = []
+    for case in results["results"]:
+        old = previous.get(case_key(case))
+        if old is None:
+            continue
+        old_p95 = old["phases"]["frame"]["p95"]
+        new_p95 = case["phases"]["frame"]["p95"]
+        if new_p95 > old_p95 * (1 + threshold):
+            regressions.append({"case": case_key(case), "baseline_p95": old_p95,
+                                "p95": new_p95})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--knots", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--points", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--steps", type=int, nargs="+", default=[10, 35])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--knot-class", choices=sorted(KNOT_CLASSES), default="array")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative p95 frame time growth (default 0.2)")
+    args = parser.parse_args(argv)
+
+    pygame.display.init()
+    results = {"config": {"frames": args.frames, "warmup": args.warmup, "seed": args.seed,
+                          "knot_class": args.knot_class, "screen": SCREEN_DIM},
+               "results": []}
+    for knots in args.knots:
+        for points in args.points:
+            for steps in args.steps:
+                case = run_case(knots, points, steps, args.frames, args.warmup, args.seed,
+                                KNOT_CLASSES[args.knot_class])
+                results["results"].append(case)
+                frame = case["phases"]["frame"]
+                print("knots=%-5d points=%-4d steps=%-3d p50=%.3fms p95=%.3fms p99=%.3fms"
+                      % (knots, points, steps, frame["p50"], frame["p95"], frame["p99"]),
+                      file=sys.stderr)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+        results["regressions"] = regressions
+        for regression in regressions:
+            print("REGRESSION knots=%d points=%d steps=%d: p95 %.3fms -> %.3fms"
+                  % (regression["case"] + (regression["baseline_p95"], regression["p95"])),
+                  file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    pygame.quit()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""Micro and macro benchmarks for the pattern modules.
+
+Times the real classes of my_decorator_final, my_chain, my_adapter1 and
+my_observer over the size that matters for each of them:
+
+    decorator  effect stack depth       get_stats, get_positive_effects
+    chain      handler chain length     handle() over an event mix, chain
+                                        and DispatchTable
+    adapter    grid size                MappingAdapter.lighten
+    observer   subscriber count         ObservableEngine.notify
+
+Every case reports the time and throughput per operation plus what one
+operation allocates according to tracemalloc, as JSON:
+
+    python bench_patterns.py --output patterns.json
+    python bench_patterns.py --suite chain observer --baseline patterns.json
+
+With --baseline the run exits with status 1 when the time or the peak
+allocation per operation of any case grew by more than the threshold.
+"""
+import argparse
+import itertools
+import json
+import random
+import sys
+import timeit
+import tracemalloc
+
+import my_adapter1
+import my_chain
+import my_decorator_final
+import my_observer
+
+EFFECTS = (my_decorator_final.Berserk, my_decorator_final.Blessing,
+           my_decorator_final.Weakness, my_decorator_final.Curse,
+           my_decorator_final.EvilEye)
+EVENT_MIXES = ("int", "str", "mixed")
+# Peak memory below this threshold is never reported as a regression
+ALLOC_SLACK = 256
+
+
+def decorator_cases(depths, rng):
+    for depth in depths:
+        hero = my_decorator_final.Hero()
+        for _ in range(depth):
+            hero = rng.choice(EFFECTS)(hero)
+        yield "depth=%d" % depth, "get_stats", hero.get_stats
+        yield "depth=%d" % depth, "get_positive_effects", hero.get_positive_effects
+
+
+def build_chain(length):
+    # The typed handlers sit at the end, behind the empty links
+    handler = my_chain.IntHandler(my_chain.FloatHandler(my_chain.StrHandler(
+        my_chain.NullHandler())))
+    for _ in range(max(length - 4, 0)):
+        handler = my_chain.NullHandler(handler)
+    return handler
+
+
+def build_events(mix, rng, count=64):
+    values = {"int": [1], "str": ["text"], "mixed": [1, 2.5, "text"]}[mix]
+    events = []
+    for _ in range(count):
+        value = rng.choice(values)
+        if rng.random() < 0.5:
+            events.append(my_chain.EventGet(type(value)))
+        else:
+            events.append(my_chain.EventSet(value))
+    return events
+
+
+def chain_cases(lengths, rng):
+    for length in lengths:
+        handler = build_chain(length)
+        for mix in EVENT_MIXES:
+            obj = my_chain.Object()
+            events = build_events(mix, rng)
+
+            for op_name, target in (("handle", handler),
+                                    ("table.handle", my_chain.DispatchTable(handler))):
+                def handle_events(target=target, obj=obj, events=events):
+                    for event in events:
+                        target.handle(obj, event)
+                yield ("length=%d,mix=%s" % (length, mix), "%s x%d" % (op_name, len(events)),
+                       handle_events)
+
+
+def adapter_cases(sizes, rng, lights=4, obstacles=16):
+    for width, height in sizes:
+        grid = [[0 for _ in range(width)] for _ in range(height)]
+        for value, count in ((1, lights), (-1, obstacles)):
+            for _ in range(count):
+                grid[rng.randrange(height)][rng.randrange(width)] = value
+        adapter = my_adapter1.MappingAdapter(my_adapter1.Light((width, height)))
+        yield "grid=%dx%d" % (width, height), "lighten", lambda adapter=adapter, grid=grid: \
+            adapter.lighten(grid)
+
+
+def observer_cases(counts, rng, titles=16):
+    messages = [{"title": "Achievement %d" % i, "text": "Unlocked achievement %d" % i}
+                for i in range(titles)]
+    for count in counts:
+        engine = my_observer.ObservableEngine()
+        for i in range(count):
+            printer = (my_observer.ShortNotificationPrinter if i % 2
+                       else my_observer.FullNotificationPrinter)()
+            engine.subscribe(printer)
+        for message in messages:
+            engine.notify(message)
+        cycle = itertools.cycle(messages)
+
+        def notify(engine=engine, cycle=cycle):
+            engine.notify(next(cycle))
+        yield "subscribers=%d" % count, "notify", notify
+
+
+SUITES = {"decorator": decorator_cases, "chain": chain_cases,
+          "adapter": adapter_cases, "observer": observer_cases}
+
+
+def time_op(op, repeat=5, min_time=0.05):
+    timer = timeit.Timer(op)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat, number)) / number
+    return best
+
+
+def allocations(op, number=100):
+    """(peak bytes of one op, bytes retained per op) under tracemalloc."""
+    op()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        op()
+        peak = tracemalloc.get_traced_memory()[1] - before
+        for _ in range(number - 1):
+            op()
+        retained = (tracemalloc.get_traced_memory()[0] - before) / number
+    finally:
+        tracemalloc.stop()
+    return peak, retained
+
+
+def run_suite(suite, sizes, seed=0, repeat=5, min_time=0.05):
+    results = []
+    for case, op_name, op in SUITES[suite](sizes, random.Random(seed)):
+        seconds = time_op(op, repeat, min_time)
+        peak, retained = allocations(op)
+        results.append({"suite": suite, "case": case, "op": op_name,
+                        "ns_per_op": seconds * 1e9, "ops_per_s": 1 / seconds,
+                        "peak_bytes": peak, "retained_bytes_per_op": retained})
+    return results
+
+
+def case_key(result):
+    return result["suite"], result["case"], result["op"]
+
+
+def find_regressions(results, baseline, threshold):
+    previous = {case_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        old = previous.get(case_key(result))
+        if old is None:
+            continue
+        if result["ns_per_op"] > old["ns_per_op"] * (1 + threshold):
+            regressions.append({"case": case_key(result), "metric": "ns_per_op",
+                                "baseline": old["ns_per_op"], "value": result["ns_per_op"]})
+        if result["peak_bytes"] > old["peak_bytes"] * (1 + threshold) + ALLOC_SLACK:
+            regressions.append({"case": case_key(result), "metric": "peak_bytes",
+                                "baseline": old["peak_bytes"], "value": result["peak_bytes"]})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suite", nargs="+", choices=sorted(SUITES), default=sorted(SUITES))
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--grids", nargs="+", default=["30x20", "100x100", "300x300"],
+                        help="adapter grid sizes as WIDTHxHEIGHT")
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.05,
+                        help="approximate seconds per timing repeat (default 0.05)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative growth of time or peak allocation (default 0.2)")
+    args = parser.parse_args(argv)
+
+    sizes = {"decorator": args.depths, "chain": args.lengths,
+             "adapter": [tuple(int(n) for n in grid.split("x")) for grid in args.grids],
+             "observer": args.subscribers}
+    results = {"config": {"repeat": args.repeat, "min_time": args.min_time,
+                          "seed": args.seed, "python": sys.version.split()[0]},
+               "results": []}
+    for suite in args.suite:
+        for result in run_suite(suite, sizes[suite], args.seed, args.repeat, args.min_time):
+            results["results"].append(result)
+            print("%-9s %-22s %-24s %12.0f ns %12.0f op/s peak=%dB retained=%.1fB"
+                  % (suite, result["case"], result["op"], result["ns_per_op"],
+                     result["ops_per_s"], result["peak_bytes"],
+                     result["retained_bytes_per_op"]), file=sys.stderr)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+        results["regressions"] = regressions
+        for regression in regressions:
+            print("REGRESSION %s %s %s: %s %.1f -> %.1f"
+                  % (regression["case"] + (regression["metric"], regression["baseline"],
+                                           regression["value"])), file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Randomised equivalence check for NullHandler.handle_many.
+
+Builds random handler chains, including a handler with its own handle()
+that the DispatchTable cannot see through, and random event sequences.
+handle_many on a list, on a one-shot iterator and on an ObjectStore must
+give the results and final objects of calling chain.handle(obj, event)
+for every event and object in order:
+
+    python check_chain.py --seed 0 --rounds 1500
+
+Exits with status 1 on the first mismatch.
+"""
+import argparse
+import copy
+import random
+import sys
+
+import numpy as np
+
+import my_chain as chain_module
+
+
+class Shout(chain_module.NullHandler):
+    """Handler with its own handle(): upper-cases strings, answers gets of bool."""
+
+    def handle(self, obj, event):
+        if event.kind == chain_module.E_str and isinstance(event, chain_module.EventSet):
+            obj.s = event.value.upper()
+            return "shout"
+        if event.kind is None and isinstance(event, chain_module.EventGet):
+            return obj.i + 1
+        return super().handle(obj, event)
+
+
+HANDLERS = (chain_module.IntHandler, chain_module.FloatHandler, chain_module.StrHandler,
+            chain_module.NullHandler, Shout)
+VALUES = (1, -7, 2 ** 70, 2.5, "x", "yz", True, None)
+
+
+def random_chain(rng):
+    handler = chain_module.NullHandler() if rng.random() < 0.5 else None
+    for _ in range(rng.randint(1, 6)):
+        handler = rng.choice(HANDLERS)(handler)
+    return handler
+
+
+def random_event(rng):
+    if rng.random() < 0.5:
+        return chain_module.EventSet(rng.choice(VALUES))
+    return chain_module.EventGet(rng.choice((int, float, str, bool)))
+
+
+def reference(handler, objects, events):
+    results = []
+    for event in events:
+        values = [handler.handle(obj, event) for obj in objects]
+        results.append(values if any(value is not None for value in values) else None)
+    return results
+
+
+def plain(result):
+    if isinstance(result, np.ndarray):
+        return result.tolist()
+    return result
+
+
+def check(seed, rounds):
+    rng = random.Random(seed)
+    for _ in range(rounds):
+        handler = random_chain(rng)
+        objects = []
+        for _ in range(rng.randint(0, 5)):
+            obj = chain_module.Object()
+            obj.i, obj.f, obj.s = rng.randint(0, 9), rng.random(), rng.choice("abc")
+            objects.append(obj)
+        events = [random_event(rng) for _ in range(rng.randint(1, 20))]
+        as_list, as_iterator = copy.deepcopy(objects), copy.deepcopy(objects)
+        store = chain_module.ObjectStore.from_objects(objects)
+        expected = reference(handler, objects, events)
+        got = {"list": handler.handle_many(as_list, events),
+               "iterator": handler.handle_many(iter(as_iterator), events),
+               "store": [plain(result) for result in handler.handle_many(store, events)]}
+        for name, results in got.items():
+            if results != expected:
+                print("%s results differ:\n  expected %r\n  got      %r"
+                      % (name, expected, results), file=sys.stderr)
+                return False
+        final = [(obj.i, obj.f, obj.s) for obj in objects]
+        for name, others in (("list", as_list), ("iterator", as_iterator),
+                             ("store", list(store))):
+            if [(obj.i, obj.f, obj.s) for obj in others] != final:
+                print("%s objects differ after %r" % (name, events), file=sys.stderr)
+                return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seeds", type=int, default=5, help="number of seeds to run")
+    parser.add_argument("--rounds", type=int, default=1500)
+    args = parser.parse_args(argv)
+
+    for seed in range(args.seed, args.seed + args.seeds):
+        if not check(seed, args.rounds):
+            print("seed %d failed" % seed, file=sys.stderr)
+            return 1
+    print("ok: %d seeds x %d rounds" % (args.seeds, args.rounds), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
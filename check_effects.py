@@ -0,0 +1,160 @@
+"""Randomised equivalence check for the compiled hero effect stacks.
+
+Builds random forests of effect chains over my_decorator_final, edits
+them (new layers, reassigned bases, changed hero stats) and after every
+edit compares get_stats and the effect lists of random effects with a
+reference that applies the layers one by one, the way the original
+deepcopy implementation did:
+
+    python check_effects.py --seed 0 --rounds 200
+
+Exits with status 1 on the first mismatch.
+"""
+import argparse
+import random
+import sys
+
+import my_decorator_final as effects
+
+STACKED = (effects.Berserk, effects.Blessing, effects.Weakness, effects.Curse,
+           effects.EvilEye)
+
+
+class DoubleLuck(effects.AbstractPositive):
+    """Opaque layer: its own get_stats, so it is not folded into a stack."""
+    __slots__ = ()
+
+    def get_positive_effects(self):
+        return self.base.get_positive_effects() + ["DoubleLuck"]
+
+    def get_stats(self):
+        base = self.base
+        stats = dict(base.get_stats() if isinstance(base, effects.AbstractEffect) else base.stats)
+        stats["Luck"] *= 2
+        return stats
+
+
+def reference(node):
+    """(stats, positive, negative) of `node`, one layer at a time."""
+    if not isinstance(node, effects.AbstractEffect):
+        return (dict(node.stats), list(node.get_positive_effects()),
+                list(node.get_negative_effects()))
+    stats, positive, negative = reference(node.base)
+    if isinstance(node, DoubleLuck):
+        stats["Luck"] *= 2
+        positive.append("DoubleLuck")
+        return stats, positive, negative
+    for name, value in type(node).stat_delta.items():
+        stats[name] += value
+    if isinstance(node, effects.AbstractPositive):
+        positive.append(type(node).__name__)
+    else:
+        negative.append(type(node).__name__)
+    return stats, positive, negative
+
+
+def actual(node):
+    return (dict(node.get_stats()), list(node.get_positive_effects()),
+            list(node.get_negative_effects()))
+
+
+def chain_of(node):
+    while isinstance(node, effects.AbstractEffect):
+        yield node
+        node = node.base
+
+
+def check(seed, rounds, max_depth=200):
+    rng = random.Random(seed)
+    heroes = [effects.Hero() for _ in range(3)]
+    nodes = []
+    for _ in range(rounds):
+        action = rng.random()
+        if not nodes or action < 0.45:
+            base = rng.choice(nodes) if nodes and rng.random() < 0.8 else None
+            if base is not None and sum(1 for _ in chain_of(base)) >= max_depth:
+                base = None
+            cls = DoubleLuck if rng.random() < 0.05 else rng.choice(STACKED)
+            node = cls(base)
+            if base is None and rng.random() < 0.5:
+                node.base = rng.choice(heroes)
+            nodes.append(node)
+        elif action < 0.6:
+            node, target = rng.choice(nodes), rng.choice(nodes + heroes)
+            # No cycles and no chains that are too deep
+            if(node not in chain_of(target)
+               and sum(1 for _ in chain_of(target)) < max_depth):
+                node.base = target
+        elif action < 0.7:
+            hero = rng.choice(heroes)
+            hero.stats[rng.choice(effects.STAT_NAMES)] += rng.randint(-5, 5)
+        for node in rng.sample(nodes, min(len(nodes), 5)):
+            expected, got = reference(node), actual(node)
+            if expected != got:
+                print("mismatch for %r:\n  expected %r\n  got      %r" % (node, expected, got),
+                      file=sys.stderr)
+                return False
+    batch = effects.HeroBatch(nodes)
+    for i, node in enumerate(nodes):
+        if(batch.get_stats(i) != node.get_stats()
+           or batch.positive_effects[i] != node.get_positive_effects()
+           or batch.negative_effects[i] != node.get_negative_effects()):
+            print("HeroBatch mismatch for %r" % (node,), file=sys.stderr)
+            return False
+    return True
+
+
+def check_local_invalidation():
+    """Reassigning a base must refresh the chain it is in and keep the
+    caches of unrelated chains."""
+    first, second = effects.Berserk(), effects.Curse()
+    for _ in range(10):
+        first, second = effects.Blessing(first), effects.Weakness(second)
+    first.get_stats()
+    second.get_stats()
+    cache = second._cache
+    first.base.base = effects.EvilEye()
+    second.get_stats()
+    return second._cache is cache and first.get_stats() == reference(first)[0]
+
+
+def check_deep_chain(depth=20000):
+    node = effects.Berserk()
+    for _ in range(depth - 1):
+        node = effects.Weakness(node)
+    stats = node.get_stats()
+    return (stats["Strength"] == 15 + 7 - 4 * (depth - 1)
+            and node.get_negative_effects() == ["Weakness"] * (depth - 1))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seeds", type=int, default=20, help="number of seeds to run")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    for cls in (effects.AbstractEffect, effects.AbstractPositive, effects.AbstractNegative):
+        try:
+            cls()
+        except TypeError:
+            pass
+        else:
+            print("%s can be instantiated" % cls.__name__, file=sys.stderr)
+            return 1
+    if not check_local_invalidation():
+        print("reassigning a base broke the caches", file=sys.stderr)
+        return 1
+    if not check_deep_chain():
+        print("deep chain gives wrong results", file=sys.stderr)
+        return 1
+    for seed in range(args.seed, args.seed + args.seeds):
+        if not check(seed, args.rounds):
+            print("seed %d failed" % seed, file=sys.stderr)
+            return 1
+    print("ok: %d seeds x %d rounds" % (args.seeds, args.rounds), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
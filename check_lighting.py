@@ -0,0 +1,123 @@
+"""Randomised equivalence checks for incremental and tiled lighting.
+
+Runs a MappingAdapter with incremental=True next to a plain one over
+random maps and random sequences of edits, from a few changed cells to
+hundreds (which fall back to a full relight), with lists and arrays as
+input. Every lightmap must match the full relight.
+
+Then lights random maps with TiledLight, with tiles smaller and larger
+than the light radius, one worker and several: regions, whole maps,
+written blocks and MappingAdapter updates must all match
+compute_lightmap on the whole map:
+
+    python check_lighting.py --seed 0 --ticks 40
+
+Exits with status 1 on the first mismatch.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+import my_adapter1 as lighting
+import my_adapter_tiles as tiles
+
+SIZES = ((60, 40, 4), (37, 53, 6), (120, 80, 10))
+# (width, height, radius, tile, workers)
+TILED_SIZES = ((97, 61, 5, 16, 2), (50, 50, 8, 7, 1), (130, 40, 3, 64, 3))
+
+
+def random_grid(rng, width, height):
+    grid = np.where(rng.random((height, width)) < 0.12, -1, 0)
+    grid[rng.random((height, width)) < 0.01] = 1
+    return grid
+
+
+def check_incremental(seed, ticks):
+    rng = np.random.default_rng(seed)
+    for width, height, radius in SIZES:
+        grid = random_grid(rng, width, height)
+        incremental = lighting.MappingAdapter(lighting.Light((1, 1), radius), incremental=True)
+        full = lighting.MappingAdapter(lighting.Light((1, 1), radius))
+        for tick in range(ticks):
+            edits = rng.integers(0, 300) if tick % 10 == 0 else rng.integers(0, 6)
+            for _ in range(edits):
+                grid[rng.integers(0, height), rng.integers(0, width)] = rng.choice((-1, 0, 1))
+            got = incremental.lighten(grid.tolist() if tick % 2 else grid)
+            expected = full.lighten(grid)
+            if not np.allclose(got, expected, atol=1e-12):
+                print("%dx%d, radius %d, tick %d: off by %g"
+                      % (width, height, radius, tick, np.abs(got - expected).max()),
+                      file=sys.stderr)
+                return False
+        lights, obstacles = lighting.find_cells(grid)
+        light = incremental.adaptee
+        if(not np.array_equal(light.lights, lights)
+           or not np.array_equal(light.obstacles, obstacles)):
+            print("%dx%d: lights/obstacles out of date" % (width, height), file=sys.stderr)
+            return False
+    return True
+
+
+def full_lightmap(grid, radius):
+    height, width = grid.shape
+    return lighting.compute_lightmap((width, height), *lighting.find_cells(grid), radius=radius)
+
+
+def check_tiled(seed, ticks):
+    rng = np.random.default_rng(seed)
+    for width, height, radius, tile, workers in TILED_SIZES:
+        grid = random_grid(rng, width, height)
+        light = tiles.TiledLight((width, height), tile=tile, radius=radius, workers=workers)
+        try:
+            lights, obstacles = lighting.find_cells(grid)
+            light.set_lights(lights)
+            light.set_obstacles(obstacles)
+            failed = None
+            for _ in range(3):
+                x0, y0 = rng.integers(0, width), rng.integers(0, height)
+                x1, y1 = rng.integers(x0 + 1, width + 1), rng.integers(y0 + 1, height + 1)
+                expected = full_lightmap(grid, radius)[y0:y1, x0:x1]
+                if not np.allclose(light.region(x0, y0, x1, y1), expected, atol=1e-6):
+                    failed = failed or "region (%d, %d, %d, %d)" % (x0, y0, x1, y1)
+            if not np.allclose(light.generate_lights(), full_lightmap(grid, radius), atol=1e-6):
+                failed = failed or "whole map"
+            block = random_grid(rng, 9, 6).astype(np.int8)
+            x0, y0 = rng.integers(0, width - 9), rng.integers(0, height - 6)
+            light.write_cells(x0, y0, block)
+            grid[y0:y0 + 6, x0:x0 + 9] = block
+            if not np.allclose(light.generate_lights(), full_lightmap(grid, radius), atol=1e-6):
+                failed = failed or "written block"
+            adapter = lighting.MappingAdapter(light, incremental=True)
+            for tick in range(ticks):
+                for _ in range(rng.integers(0, 6)):
+                    grid[rng.integers(0, height), rng.integers(0, width)] = rng.choice((-1, 0, 1))
+                if failed is None and not np.allclose(adapter.lighten(grid),
+                                                      full_lightmap(grid, radius), atol=1e-6):
+                    failed = "adapter tick %d" % tick
+        finally:
+            light.close()
+        if failed is not None:
+            print("%dx%d, radius %d, tile %d: %s differs"
+                  % (width, height, radius, tile, failed), file=sys.stderr)
+            return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seeds", type=int, default=3, help="number of seeds to run")
+    parser.add_argument("--ticks", type=int, default=40)
+    args = parser.parse_args(argv)
+
+    for seed in range(args.seed, args.seed + args.seeds):
+        if not (check_incremental(seed, args.ticks) and check_tiled(seed, args.ticks // 4)):
+            print("seed %d failed" % seed, file=sys.stderr)
+            return 1
+    print("ok: %d seeds x %d ticks" % (args.seeds, args.ticks), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""Process-pool knot engine for very large scenes.
+
+All knots of a KnotDisplay are packed into shared-memory arrays (one row
+per base point plus a per-knot offset table), so worker processes step
+the physics and smooth their slice of knots in place without pickling any
+state. Output is double buffered: while the main process draws frame N
+from one buffer, the workers already fill the other one with frame N + 1.
+
+    knot_display = ParallelKnotDisplay(display, workers=8)
+
+ParallelKnotDisplay is a drop-in KnotDisplay. The knots' own point lists
+are only written back when something edits them (add/delete points or
+knots, speed changes), which is also when the shared state is rebuilt.
+Adaptive level of detail is not used by the parallel engine.
+"""
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from refact_Konstantinov import KnotDisplay, bezier_basis, step_points
+
+_attached = {}
+
+
+def _attach(name, shape, dtype):
+    shm = _attached.get(name)
+    if shm is None:
+        shm = _attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _forget(keep):
+    for name in list(_attached):
+        if name not in keep:
+            _attached.pop(name).close()
+
+
+def smooth_packed(points, offsets, count):
+    """Smooth several knots packed back to back in `points` at once.
+
+    `offsets` (K + 1,) delimits the knots; the result has `count` rows per
+    point in the same order. Knots with fewer than three points produce
+    rows that are never drawn.
+    """
+    sizes = np.diff(offsets)
+    knot = np.repeat(np.arange(len(sizes)), sizes)
+    start = offsets[:-1][knot]
+    size = sizes[knot]
+    local = np.arange(len(points)) - (start - offsets[0])
+    prev2 = points[start - offsets[0] + (local - 2) % size]
+    prev1 = points[start - offsets[0] + (local - 1) % size]
+    controls = np.empty((len(points), 3, 2))
+    controls[:, 0] = (prev2 + prev1) * 0.5
+    controls[:, 1] = prev1
+    controls[:, 2] = (prev1 + points) * 0.5
+    return (bezier_basis(count) @ controls).reshape(-1, 2)
+
+
+def _step_chunk(layout, first, last, count, steps, alpha, out):
+    state_name, offsets_name, out_names, n_points, n_knots = layout
+    _forget({state_name, offsets_name} | set(out_names))
+    state = _attach(state_name, (3, n_points, 2), np.float64)
+    offsets = _attach(offsets_name, (n_knots + 1,), np.int64)[first:last + 1]
+    result = _attach(out_names[out], (n_points * (count + 2), 2), np.float64)
+
+    lo, hi = offsets[0], offsets[-1]
+    points, speeds, prev = state[0, lo:hi], state[1, lo:hi], state[2, lo:hi]
+    for step in range(steps):
+        if step == steps - 1:
+            prev[:] = points
+        step_points(points, speeds)
+    render = result[lo:hi]
+    if alpha >= 1:
+        render[:] = points
+    else:
+        np.multiply(points - prev, alpha, out=render)
+        render += prev
+    # The frame's speeds go into the same buffer as the points to draw
+    result[n_points + lo:n_points + hi] = speeds
+    if hi > lo:
+        knots = result[2 * n_points + lo * count:2 * n_points + hi * count]
+        knots[:] = smooth_packed(render, offsets, count)
+
+
+class _SharedArray:
+    def __init__(self, shape, dtype=np.float64):
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.name = self.shm.name
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+
+    def release(self):
+        self.array = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ParallelKnotEngine:
+    """Step and smooth packed knots across a process pool."""
+
+    def __init__(self, workers=None, chunks_per_worker=4):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunks_per_worker = chunks_per_worker
+        self._pool = None
+        self._state = None
+        self._offsets = None
+        self._out = []
+        self._count = None
+        self._front = 0
+        self._pending = None
+        self._chunks = []
+
+    @property
+    def loaded(self):
+        return self._state is not None
+
+    @property
+    def count(self):
+        return self._count
+
+    def load(self, knot_list):
+        """Copy the knots' points and speeds into fresh shared memory."""
+        self.unload()
+        sizes = [len(each_knot._point_array()) for each_knot in knot_list]
+        offsets = np.concatenate(([0], np.cumsum(sizes, dtype=np.int64)))
+        n_points = int(offsets[-1])
+        self._state = _SharedArray((3, n_points, 2))
+        self._offsets = _SharedArray((len(knot_list) + 1,), np.int64)
+        self._offsets.array[:] = offsets
+        for each_knot, lo, hi in zip(knot_list, offsets[:-1], offsets[1:]):
+            self._state.array[0, lo:hi] = each_knot._point_array()
+            self._state.array[1, lo:hi] = each_knot._speed_array()
+        self._state.array[2] = self._state.array[0]
+        self._chunks = self._split(offsets)
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.workers)
+
+    def _split(self, offsets):
+        n_knots = len(offsets) - 1
+        n_chunks = min(n_knots, self.workers * self.chunks_per_worker)
+        if n_chunks == 0:
+            return []
+        # Cut at knot boundaries so every chunk holds about as many points.
+        targets = offsets[-1] * np.arange(1, n_chunks) / n_chunks
+        cuts = np.searchsorted(offsets, targets)
+        bounds = np.unique(np.concatenate(([0], cuts, [n_knots])))
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def store(self, knot_list):
+        """Write the simulated points and speeds back into the knots."""
+        self.wait()
+        offsets = self._offsets.array
+        for each_knot, lo, hi in zip(knot_list, offsets[:-1], offsets[1:]):
+            each_knot._set_arrays(self._state.array[0, lo:hi], self._state.array[1, lo:hi])
+            each_knot._prev_points = None
+            each_knot.mark_dirty()
+
+    def unload(self):
+        self.wait()
+        for shared in [self._state, self._offsets] + self._out:
+            if shared is not None:
+                shared.release()
+        self._state = self._offsets = None
+        self._out = []
+        self._count = None
+
+    def _layout(self):
+        n_points = self._state.array.shape[1]
+        return (self._state.name, self._offsets.name, tuple(out.name for out in self._out),
+                n_points, len(self._offsets.array) - 1)
+
+    def submit(self, count, steps=1, alpha=1.0):
+        """Start computing the next frame into the back buffer."""
+        self.wait()
+        if count != self._count:
+            for shared in self._out:
+                shared.release()
+            n_points = self._state.array.shape[1]
+            self._out = [_SharedArray((n_points * (count + 2), 2)) for _ in range(2)]
+            self._count = count
+        back = 1 - self._front
+        layout = self._layout()
+        self._pending = [self._pool.apply_async(_step_chunk,
+                                                (layout, first, last, count, steps, alpha, back))
+                         for first, last in self._chunks]
+
+    def wait(self):
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            for result in pending:
+                result.get()
+            self._front = 1 - self._front
+
+    def frame(self):
+        """(render points, speeds, knot points) of the newest finished frame, per knot.
+
+        The arrays are views of the front buffer and stay valid until the
+        next wait().
+        """
+        offsets = self._offsets.array
+        n_points = len(self._state.array[0])
+        result = self._out[self._front].array
+        count = self._count
+        return [(result[lo:hi], result[n_points + lo:n_points + hi],
+                 result[2 * n_points + lo * count:2 * n_points + hi * count])
+                for lo, hi in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    def state(self):
+        """Copies of every knot's (points, speeds) once pending steps finished."""
+        self.wait()
+        offsets = self._offsets.array.tolist()
+        return [(self._state.array[0, lo:hi].copy(), self._state.array[1, lo:hi].copy())
+                for lo, hi in zip(offsets[:-1], offsets[1:])]
+
+    def close(self):
+        self.unload()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class ParallelKnotDisplay(KnotDisplay):
+    """KnotDisplay whose physics and smoothing run in a ParallelKnotEngine.
+
+    Each `advance`/`set_all` collects the frame the workers computed last
+    time and immediately starts the next one, so drawing overlaps with the
+    computation of the following frame.
+    """
+
+    def __init__(self, display, new_knot=None, workers=None):
+        super().__init__(display, new_knot)
+        self.engine = ParallelKnotEngine(workers)
+        self._frame = None
+
+    def _unload(self):
+        self._frame = None
+        if self.engine.loaded:
+            self.engine.store(self.knot_list)
+            self.engine.unload()
+
+    def _run(self, count, steps, alpha):
+        if self.engine.loaded and self.engine.count != count:
+            self._unload()
+        if not self.engine.loaded:
+            self.engine.load(self.knot_list)
+            self.engine.submit(count, steps, alpha)
+            steps = 0
+        self.engine.wait()
+        self._frame = self.engine.frame()
+        self.engine.submit(count, steps, alpha)
+        if self.profiler is not None and self.profiler.enabled:
+            self.profiler.add_points(sum(len(points) for points, _, _ in self._frame) * count)
+            self.profiler.mark("smooth")
+
+    def advance(self, frame_time, count):
+        steps = self.clock.advance(frame_time)
+        self._run(count, steps, self.clock.alpha)
+
+    def set_all(self, count):
+        self._run(count, 1, 1.0)
+
+    def frame_state(self):
+        # The state the drawn frame was computed from, not the next step
+        if self._frame is not None and len(self._frame) == len(self.knot_list):
+            return [(points, speeds) for points, speeds, _ in self._frame]
+        return super().frame_state()
+
+    def move_all(self):
+        self._unload()
+        super().move_all()
+
+    def smooth_all(self, count):
+        self._unload()
+        super().smooth_all(count)
+
+    def _draw_knots(self, count):
+        if self._frame is None or len(self._frame) != len(self.knot_list):
+            return super()._draw_knots(count)
+        drawn_rects = []
+        for each_knot, (points, _, knot_points) in zip(self.knot_list, self._frame):
+            drawn_rects.append(each_knot.draw_line(style='points', line_points=points,
+                                                   color=self._color))
+            if len(points) >= 3:
+                drawn_rects.append(each_knot.draw_line(style='line', line_points=knot_points,
+                                                       color=self._color))
+        return drawn_rects
+
+    def add_knot(self, knot_to_add):
+        self._unload()
+        super().add_knot(knot_to_add)
+
+    def pop_knot(self):
+        self._unload()
+        super().pop_knot()
+
+    def add_point(self, point_to_add, speed_to_add, count):
+        self._unload()
+        super().add_point(point_to_add, speed_to_add, count)
+
+    def pop_point(self, count):
+        self._unload()
+        super().pop_point(count)
+
+    def speed_up(self):
+        self._unload()
+        super().speed_up()
+
+    def speed_down(self):
+        self._unload()
+        super().speed_down()
+
+    def restart_display(self):
+        self._unload()
+        super().restart_display()
+
+    def close(self):
+        self._unload()
+        self.engine.close()
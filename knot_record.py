@@ -0,0 +1,140 @@
+"""Recorded screensaver sessions and headless frame export.
+
+A session file is a small header followed by one record per frame:
+
+    header: b"KNOTREC1", screen width, height        (<8sHH)
+    frame:  steps, number of knots                   (<II)
+            base points of every knot                (<I each)
+            all points, then all speeds, as float32  (N x 2 each)
+
+Record a session with ``python refact_Konstantinov.py --record run.knots``
+and render it to images without a display:
+
+    python knot_record.py run.knots --out frames/frame_%06d.png
+
+Frames are read through a memory map and rendered one at a time, so
+memory use does not depend on the length of the recording.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from refact_Konstantinov import SCREEN_DIM, ArrayKnot, KnotDisplay
+
+MAGIC = b"KNOTREC1"
+_HEADER = struct.Struct("<8sHH")
+_FRAME = struct.Struct("<II")
+
+
+class SessionWriter:
+    """Append KnotDisplay frames to a session file."""
+
+    def __init__(self, path, screen_dim=SCREEN_DIM):
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, *screen_dim))
+        self.frames = 0
+
+    def write_frame(self, knot_states, steps):
+        """Write one frame of (points, speeds) array pairs, one per knot."""
+        sizes = np.array([len(points) for points, _ in knot_states], dtype="<u4")
+        self._file.write(_FRAME.pack(steps, len(sizes)))
+        self._file.write(sizes.tobytes())
+        if sizes.sum():
+            for column in (0, 1):
+                data = np.concatenate([state[column] for state in knot_states])
+                self._file.write(data.astype("<f4").tobytes())
+        self.frames += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_session(path):
+    """Yield the recorded screen size, then (steps, [(points, speeds), ...]) per frame."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, width, height = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a recorded knot session" % path)
+        yield width, height
+        offset = _HEADER.size
+        while offset < len(data):
+            steps, n_knots = _FRAME.unpack_from(data, offset)
+            offset += _FRAME.size
+            sizes = np.frombuffer(data, dtype="<u4", count=n_knots, offset=offset).tolist()
+            offset += 4 * n_knots
+            total = sum(sizes)
+            columns = []
+            for _ in (0, 1):
+                # Copy out of the map right away: no view may outlive it.
+                columns.append(np.frombuffer(data, dtype="<f4", count=2 * total, offset=offset)
+                               .astype(float).reshape(-1, 2))
+                offset += 8 * total
+            bounds = np.cumsum([0] + sizes).tolist()
+            yield steps, [(columns[0][lo:hi], columns[1][lo:hi])
+                          for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def render_session(path, start=0, stop=None, every=1):
+    """Yield (frame number, surface) for the selected frames of a session."""
+    frames = read_session(path)
+    surface = pygame.Surface(next(frames))
+    knot_display = KnotDisplay(display=surface)
+    for number, (steps, knot_states) in enumerate(frames):
+        if stop is not None and number >= stop:
+            break
+        knot_display.restart_display()
+        for points, speeds in knot_states:
+            knot_display.add_knot(ArrayKnot(surface, points, speeds))
+        # Every frame advances the hue, skipped or not, to match the live run.
+        if number < start or (number - start) % every:
+            if knot_states:
+                knot_display._hue = (knot_display._hue + 1) % 360
+            continue
+        knot_display.draw_all(count=steps)
+        yield number, surface
+
+
+def export_frames(path, pattern, start=0, stop=None, every=1):
+    """Render a session to images named `pattern % frame number`, return the count."""
+    directory = os.path.dirname(pattern)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    exported = 0
+    for number, surface in render_session(path, start, stop, every):
+        pygame.image.save(surface, pattern % number)
+        exported += 1
+    return exported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a recorded knot session to images.")
+    parser.add_argument("session")
+    parser.add_argument("--out", default="frames/frame_%06d.png",
+                        help="output file pattern (default frames/frame_%%06d.png)")
+    parser.add_argument("--start", type=int, default=0)
+    parser.add_argument("--stop", type=int)
+    parser.add_argument("--every", type=int, default=1, help="export every n-th frame")
+    args = parser.parse_args(argv)
+
+    pygame.display.init()
+    exported = export_frames(args.session, args.out, args.start, args.stop, args.every)
+    print("exported %d frames" % exported, file=sys.stderr)
+    pygame.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
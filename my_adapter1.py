@@ -1,23 +1,163 @@
+import functools
+
+import numpy as np
+
+LIGHT_RADIUS = 10
+# Сколько проверок клеток делается за один векторный проход
+_BATCH_CELLS = 1 << 22
+
+
+@functools.lru_cache(maxsize=16)
+def light_stencil(radius):
+    """Cells a light of `radius` reaches and the cells on the ray to each.
+
+    Returns (dy, dx, weight, ray_dy, ray_dx, ray_valid): offsets of the n
+    reached cells, their linear falloff weight, and (n, radius - 1)
+    offsets of the cells strictly between the light and each cell.
+    """
+    span = np.arange(-radius, radius + 1)
+    dy, dx = (offsets.ravel() for offsets in np.meshgrid(span, span, indexing="ij"))
+    distance = np.hypot(dx, dy)
+    reached = distance <= radius
+    dy, dx, distance = dy[reached], dx[reached], distance[reached]
+    weight = 1 - distance / (radius + 1)
+
+    steps = np.maximum(np.abs(dx), np.abs(dy))
+    k = np.arange(1, max(radius, 1))
+    ray_valid = k < steps[:, None]
+    t = k / np.maximum(steps, 1)[:, None]
+    ray_dy = np.where(ray_valid, np.rint(dy[:, None] * t), 0).astype(np.intp)
+    ray_dx = np.where(ray_valid, np.rint(dx[:, None] * t), 0).astype(np.intp)
+    for array in (dy, dx, weight, ray_dy, ray_dx, ray_valid):
+        array.flags.writeable = False
+    return dy, dx, weight, ray_dy, ray_dx, ray_valid
+
+
+def compute_lightmap(dim, lights, obstacles, radius=LIGHT_RADIUS):
+    """Illumination of a (width, height) map as a (height, width) array.
+
+    Every light in `lights` ((x, y) cells) lights the cells within
+    `radius` with linear falloff, unless an obstacle cell lies on the ray
+    between them (obstacle cells themselves are lit). Contributions add
+    up and are clipped to 1.
+    """
+    width, height = dim
+    pad = radius
+    padded_width = width + 2 * pad
+    blocked = np.zeros((height + 2 * pad, padded_width), dtype=bool)
+    if len(obstacles):
+        x, y = np.asarray(obstacles, dtype=np.intp).reshape(-1, 2).T
+        blocked[y + pad, x + pad] = True
+    blocked = blocked.ravel()
+    total = np.zeros(blocked.size)
+
+    dy, dx, weight, ray_dy, ray_dx, ray_valid = light_stencil(radius)
+    cells = dy * padded_width + dx
+    rays = ray_dy * padded_width + ray_dx
+    if len(lights):
+        x, y = np.asarray(lights, dtype=np.intp).reshape(-1, 2).T
+        bases = (y + pad) * padded_width + (x + pad)
+        batch = max(1, _BATCH_CELLS // max(rays.size, 1))
+        for start in range(0, len(bases), batch):
+            base = bases[start:start + batch, None]
+            # Клетка в тени, если на луче до неё есть препятствие
+            shadow = (blocked[base[:, :, None] + rays] & ray_valid).any(axis=2)
+            lit = ~shadow
+            total += np.bincount((base + cells)[lit], np.broadcast_to(weight, lit.shape)[lit],
+                                 minlength=total.size)
+
+    lightmap = total.reshape(-1, padded_width)[pad:pad + height, pad:pad + width]
+    return np.minimum(lightmap, 1)
+
+
+def find_cells(cells):
+    """(x, y) arrays of the light (1) and obstacle (-1) cells, in one pass."""
+    index = np.flatnonzero(cells)
+    values = cells.ravel()[index]
+    y, x = np.divmod(index, cells.shape[1])
+    coords = np.column_stack((x, y))
+    return coords[values == 1], coords[values == -1]
+
+
 class Light:
-    def __init__(self, dim):
+    def __init__(self, dim, radius=LIGHT_RADIUS):
         self.dim = dim
-        self.grid = [[0 for i in range(dim[0])] for _ in range(dim[1])]
-        self.lights = []
-        self.obstacles = []
+        self.radius = radius
+        self.grid = np.zeros((dim[1], dim[0]))
+        self._lights = []
+        self._obstacles = []
+        self._cells = None # Карта клеток, из которой lights/obstacles берутся по требованию
+        self._stale = True # Карта пересчитывается при следующем generate_lights
+
+    @property
+    def lights(self):
+        self._split_cells()
+        return self._lights
+
+    @lights.setter
+    def lights(self, lights):
+        self._split_cells()
+        self._lights = lights
+
+    @property
+    def obstacles(self):
+        self._split_cells()
+        return self._obstacles
+
+    @obstacles.setter
+    def obstacles(self, obstacles):
+        self._split_cells()
+        self._obstacles = obstacles
+
+    def _split_cells(self):
+        if self._cells is not None:
+            self._lights, self._obstacles = find_cells(self._cells)
+            self._cells = None
         
     def set_dim(self, dim):
         self.dim = dim
-        self.grid = [[0 for i in range(dim[0])] for _ in range(dim[1])]
+        self.grid = np.zeros((dim[1], dim[0]))
+        self._stale = True
     
     def set_lights(self, lights):
         self.lights = lights
-        self.generate_lights()
+        self._stale = True
     
     def set_obstacles(self, obstacles):
         self.obstacles = obstacles
-        self.generate_lights()
+        self._stale = True
+
+    def update(self, cells, changed):
+        """Take a new map of cells (1 light, -1 obstacle) that differs
+        from the current lights and obstacles only at the `changed` (x, y)
+        cells, and relight just the area those cells can reach."""
+        self._cells = cells
+        changed = np.asarray(changed, dtype=np.intp).reshape(-1, 2)
+        if self._stale or not len(changed):
+            return
+        width, height = self.dim
+        radius = self.radius
+        # Изменённая клетка влияет на клетки в пределах 2R, а их освещают
+        # источники ещё на R дальше
+        block = 2 * radius + 1
+        blocks = np.unique(changed // block, axis=0)
+        if len(blocks) * (block + 4 * radius) ** 2 >= width * height:
+            self._stale = True
+            return
+        for bx, by in blocks.tolist():
+            x0, y0 = max(bx * block - 2 * radius, 0), max(by * block - 2 * radius, 0)
+            x1 = min((bx + 1) * block + 2 * radius, width)
+            y1 = min((by + 1) * block + 2 * radius, height)
+            wx0, wy0 = max(x0 - radius, 0), max(y0 - radius, 0)
+            wx1, wy1 = min(x1 + radius, width), min(y1 + radius, height)
+            window = compute_lightmap((wx1 - wx0, wy1 - wy0),
+                                      *find_cells(cells[wy0:wy1, wx0:wx1]), radius=radius)
+            self.grid[y0:y1, x0:x1] = window[y0 - wy0:y1 - wy0, x0 - wx0:x1 - wx0]
         
     def generate_lights(self):
+        if self._stale:
+            self.grid = compute_lightmap(self.dim, self.lights, self.obstacles, self.radius)
+            self._stale = False
         return self.grid.copy()
 
 
@@ -32,26 +172,24 @@ class System:
 
 
 class MappingAdapter(System):
-    def __init__(self, adaptee):
+    """With incremental=True every lighten() diffs the grid against the
+    previous one and only relights around the cells that changed."""
+
+    def __init__(self, adaptee, incremental=False):
         self.adaptee = adaptee
+        self.incremental = incremental
+        self._previous = None
 
     def lighten(self, grid):
-        self.adaptee.set_dim((len(grid[0]), len(grid)))
-        
-        lights = []
-        for idy, each_list in enumerate(grid):
-            idx_found = [index for index, value in enumerate(each_list) if value == 1]
-            if len(idx_found):
-                for idx in idx_found:
-                    lights.append((idx, idy)) 
-        
-        obstacles = []    
-        for idy, each_list in enumerate(grid):
-            idx_found = [index for index, value in enumerate(each_list) if value == -1]
-            if len(idx_found):
-                for idx in idx_found:
-                    obstacles.append((idx, idy)) 
-
-        self.adaptee.set_lights(lights)
-        self.adaptee.set_obstacles(obstacles)
-        return self.adaptee.generate_lights()
\ No newline at end of file
+        cells = np.asarray(grid)
+        dim = (cells.shape[1], cells.shape[0])
+        previous, self._previous = self._previous, (cells.copy() if self.incremental else None)
+        if previous is not None and previous.shape == cells.shape and self.adaptee.dim == dim:
+            changed = np.argwhere(cells != previous)[:, ::-1]
+            self.adaptee.update(self._previous, changed)
+        else:
+            lights, obstacles = find_cells(cells)
+            self.adaptee.set_dim(dim)
+            self.adaptee.set_lights(lights)
+            self.adaptee.set_obstacles(obstacles)
+        return self.adaptee.generate_lights()
@@ -0,0 +1,169 @@
+"""Tiled, memory-mapped lighting for maps larger than memory.
+
+TiledLight keeps the map (int8 cells: 1 light, -1 obstacle) and the
+lightmap (float32) in memory-mapped files and lights them tile by tile.
+A lightmap cell only depends on map cells within `radius` of it, so each
+tile is lit from a window that extends `radius` cells (the halo) past
+its borders, and tiles are independent. Tiles are lit in a process pool
+and only when something asks for them:
+
+    light = TiledLight((200000, 100000), "world/", tile=1024, radius=16)
+    light.write_cells(x0, y0, block)   # edit the map
+    view = light.region(x0, y0, x1, y1) # lights just the tiles it covers
+
+TiledLight has the Light interface (set_dim, set_lights, set_obstacles,
+update, generate_lights), so MappingAdapter can drive it as well;
+generate_lights then lights every tile and returns the memory-mapped
+lightmap.
+"""
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+
+from my_adapter1 import LIGHT_RADIUS, compute_lightmap, find_cells
+
+_opened = {}
+
+
+def _open(path, dtype, shape):
+    array = _opened.get(path)
+    if array is None or array.shape != shape:
+        array = _opened[path] = np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+    return array
+
+
+def _light_tile(job):
+    cells_path, light_path, dim, tile, radius, tx, ty = job
+    width, height = dim
+    cells = _open(cells_path, np.int8, (height, width))
+    lightmap = _open(light_path, np.float32, (height, width))
+    x0, y0 = tx * tile, ty * tile
+    x1, y1 = min(x0 + tile, width), min(y0 + tile, height)
+    wx0, wy0 = max(x0 - radius, 0), max(y0 - radius, 0)
+    wx1, wy1 = min(x1 + radius, width), min(y1 + radius, height)
+    window = compute_lightmap((wx1 - wx0, wy1 - wy0), *find_cells(cells[wy0:wy1, wx0:wx1]),
+                              radius=radius)
+    lightmap[y0:y1, x0:x1] = window[y0 - wy0:y1 - wy0, x0 - wx0:x1 - wx0]
+
+
+class TiledLight:
+    def __init__(self, dim, directory=None, tile=512, radius=LIGHT_RADIUS, workers=None):
+        self.tile = tile
+        self.radius = radius
+        self.workers = workers or os.cpu_count() or 1
+        self._tempdir = None
+        if directory is None:
+            self._tempdir = tempfile.TemporaryDirectory()
+            directory = self._tempdir.name
+        os.makedirs(directory, exist_ok=True)
+        self.cells_path = os.path.join(directory, "cells.int8")
+        self.light_path = os.path.join(directory, "light.float32")
+        self._pool = None
+        self.set_dim(dim)
+
+    def set_dim(self, dim):
+        """Start an empty map of `dim` = (width, height)."""
+        self.dim = dim
+        width, height = dim
+        shape = (height, width)
+        _opened.clear()
+        self.cells = np.memmap(self.cells_path, dtype=np.int8, mode="w+", shape=shape)
+        self.grid = np.memmap(self.light_path, dtype=np.float32, mode="w+", shape=shape)
+        tiles = (-(-height // self.tile), -(-width // self.tile))
+        self._lit = np.zeros(tiles, dtype=bool)
+
+    def _replace(self, value, coords):
+        # In bands one tile high, so the whole map is never paged in at once
+        for y0 in range(0, self.dim[1], self.tile):
+            band = self.cells[y0:y0 + self.tile]
+            band[band == value] = 0
+        coords = np.asarray(coords, dtype=np.intp).reshape(-1, 2)
+        self.cells[coords[:, 1], coords[:, 0]] = value
+        self._lit[:] = False
+
+    def set_lights(self, lights):
+        self._replace(1, lights)
+
+    def set_obstacles(self, obstacles):
+        self._replace(-1, obstacles)
+
+    @property
+    def lights(self):
+        return self._coords(1)
+
+    @property
+    def obstacles(self):
+        return self._coords(-1)
+
+    def _coords(self, value):
+        found = []
+        for y0 in range(0, self.dim[1], self.tile):
+            y, x = np.nonzero(self.cells[y0:y0 + self.tile] == value)
+            found.append(np.column_stack((x, y + y0)))
+        return np.concatenate(found) if found else np.empty((0, 2), dtype=np.intp)
+
+    def write_cells(self, x0, y0, block):
+        """Overwrite the map with `block` at (x0, y0); relight lazily."""
+        block = np.asarray(block)
+        height, width = block.shape
+        self.cells[y0:y0 + height, x0:x0 + width] = block
+        self._invalidate(x0, y0, x0 + width, y0 + height)
+
+    def update(self, cells, changed):
+        """Copy the `changed` (x, y) cells of `cells` into the map."""
+        changed = np.asarray(changed, dtype=np.intp).reshape(-1, 2)
+        x, y = changed[:, 0], changed[:, 1]
+        self.cells[y, x] = cells[y, x]
+        for cx, cy in changed.tolist():
+            self._invalidate(cx, cy, cx + 1, cy + 1)
+
+    def _invalidate(self, x0, y0, x1, y1):
+        # A cell affects the lighting no further than radius away
+        tile, radius = self.tile, self.radius
+        self._lit[max(y0 - radius, 0) // tile:(y1 - 1 + radius) // tile + 1,
+                  max(x0 - radius, 0) // tile:(x1 - 1 + radius) // tile + 1] = False
+
+    def light_tiles(self, tiles):
+        """Light the given (tx, ty) tiles that are not lit yet."""
+        jobs = [(self.cells_path, self.light_path, self.dim, self.tile, self.radius, tx, ty)
+                for tx, ty in tiles if not self._lit[ty, tx]]
+        if not jobs:
+            return
+        self.cells.flush()
+        if self.workers == 1 or len(jobs) == 1:
+            for job in jobs:
+                _light_tile(job)
+        else:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(self.workers)
+            self._pool.map(_light_tile, jobs)
+        for job in jobs:
+            self._lit[job[-1], job[-2]] = True
+
+    def region(self, x0, y0, x1, y1):
+        """Lightmap of the cells x0 <= x < x1, y0 <= y < y1, lighting as needed."""
+        tile = self.tile
+        self.light_tiles([(tx, ty) for ty in range(y0 // tile, (y1 - 1) // tile + 1)
+                          for tx in range(x0 // tile, (x1 - 1) // tile + 1)])
+        return self.grid[y0:y1, x0:x1]
+
+    def generate_lights(self):
+        """Light every tile and return the memory-mapped lightmap."""
+        tiles_y, tiles_x = self._lit.shape
+        self.light_tiles([(tx, ty) for ty in range(tiles_y) for tx in range(tiles_x)])
+        return self.grid
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self.grid.flush()
+        self.cells.flush()
+        if self._tempdir is not None:
+            _opened.clear()
+            self.cells = self.grid = None
+            self._tempdir.cleanup()
+            self._tempdir = None
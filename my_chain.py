@@ -2,6 +2,8 @@ E_int, E_float, E_str = 'E_int', 'E_float', 'E_str'
 
 import copy
 
+import numpy as np
+
 class Object:
     def __init__(self):
         self.i = 0
@@ -9,41 +11,206 @@ class Object:
         self.s = ""
 
 
+# Тип -> kind. EventGet сравнивает тип на равенство, поэтому bool там не E_int
+_TYPE_KINDS = {str: E_str, int: E_int, float: E_float}
+# Тип значения -> kind, дополняется при первом значении нового типа
+_VALUE_KINDS = {str: E_str, int: E_int, bool: E_int, float: E_float}
+_CLASS = type
+_INT64 = np.iinfo(np.int64)
+
+
+def _value_kind(value_type):
+    if issubclass(value_type, str):
+        kind = E_str
+    elif issubclass(value_type, int):
+        kind = E_int
+    elif issubclass(value_type, float):
+        kind = E_float
+    else:
+        kind = None
+    _VALUE_KINDS[value_type] = kind
+    return kind
+
+
+class ObjectStore:
+    """Many Objects kept column-wise: `i` (int64) and `f` (float64) as
+    NumPy arrays, `s` as a list. store[k] reads and writes object k.
+
+    An int that does not fit in int64 turns `i` into an object array of
+    Python ints, so any value an Object holds can be stored.
+    """
+
+    def __init__(self, size=0):
+        self.i = np.zeros(size, dtype=np.int64)
+        self.f = np.zeros(size)
+        self.s = [""] * size
+
+    @classmethod
+    def from_objects(cls, objects):
+        store = cls()
+        values = [obj.i for obj in objects]
+        try:
+            store.i = np.array(values, dtype=np.int64)
+        except OverflowError:
+            store.i = np.array(values, dtype=object)
+        store.f = np.array([obj.f for obj in objects], dtype=np.float64)
+        store.s = [obj.s for obj in objects]
+        return store
+
+    def __len__(self):
+        return len(self.s)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError("object index out of range")
+        return StoredObject(self, index % len(self))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield StoredObject(self, index)
+
+    def _fit(self, name, value):
+        # Значение вне int64 переводит колонку i на объекты Python
+        if(name == 'i' and self.i.dtype != object
+           and not _INT64.min <= value <= _INT64.max):
+            self.i = self.i.astype(object)
+
+
+class StoredObject:
+    """One row of an ObjectStore with the attributes of an Object."""
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    @property
+    def i(self):
+        return self.store.i.item(self.index)
+
+    @i.setter
+    def i(self, value):
+        self.store._fit('i', value)
+        self.store.i[self.index] = value
+
+    @property
+    def f(self):
+        return self.store.f[self.index].item()
+
+    @f.setter
+    def f(self, value):
+        self.store.f[self.index] = value
+
+    @property
+    def s(self):
+        return self.store.s[self.index]
+
+    @s.setter
+    def s(self, value):
+        self.store.s[self.index] = value
+
+
 class EventGet:
-    def __init__(self, type):
-        self.type = type
-        self.kind = None
-        if (self.type == str):
-            self.kind = E_str
-        elif (self.type == int):
-            self.kind = E_int
-        elif (self.type == float):
-            self.kind = E_float
+    """Immutable; EventGet(t) returns the same instance for the same t."""
+    __slots__ = ("type", "kind")
+    _instances = {}
+
+    def __new__(cls, type):
+        key = (cls, type)
+        try:
+            return cls._instances[key]
+        except KeyError:
+            pass
+        except TypeError: # нехешируемый аргумент
+            return cls._create(type)
+        event = cls._create(type)
+        if isinstance(type, _CLASS): # кэшируются только сами классы
+            cls._instances[key] = event
+        return event
+
+    @classmethod
+    def _create(cls, type):
+        event = object.__new__(cls)
+        object.__setattr__(event, "type", type)
+        kind = None
+        for known, known_kind in _TYPE_KINDS.items():
+            if type == known:
+                kind = known_kind
+                break
+        object.__setattr__(event, "kind", kind)
+        return event
 
+    def __setattr__(self, name, value):
+        raise AttributeError("EventGet instances are shared and cannot be changed")
+
+    def __reduce__(self):
+        return type(self), (self.type,)
 
 
 class EventSet:
+    __slots__ = ("value", "kind")
+
     def __init__(self, value):
         self.value = value
-        self.kind = None
-        if isinstance(value, str):
-            self.kind = E_str
-        elif isinstance(value, int):
-            self.kind = E_int
-        elif isinstance(value, float):
-            self.kind = E_float
+        try:
+            self.kind = _VALUE_KINDS[type(value)]
+        except KeyError:
+            self.kind = _value_kind(type(value))
 
 
 class NullHandler:
     def __init__(self, successor=None):
         self.__successor = successor
 
+    @property
+    def successor(self):
+        return self.__successor
+
     def handle(self, obj, event):
         if self.__successor is not None:
             return self.__successor.handle(obj, event)
 
+    def handle_many(self, objects, events):
+        """Handle every event on every object, events in order.
+
+        Returns one result per event: the list of per-object results, or
+        None when all of them are None (sets, unhandled events). For an
+        ObjectStore, gets of i and f return arrays, and events are grouped
+        by kind into whole-column operations.
+        """
+        if not isinstance(objects, ObjectStore):
+            objects = list(objects) # каждое событие проходит по всем объектам
+            return [_results([self.handle(obj, event) for obj in objects]) for event in events]
+        table = self.__dict__.get("_table")
+        if table is None: # Звенья неизменяемы, таблицу можно строить один раз
+            table = self._table = DispatchTable(self)
+        results = []
+        pending = {} # поле -> последнее ещё не записанное значение
+        for event in events:
+            event_class = type(event)
+            field = None
+            if event_class is EventGet or event_class is EventSet:
+                field = table._fields.get(event.kind)
+            if field is None:
+                _fill(objects, pending)
+                results.append(_results([table.handle(obj, event) for obj in objects]))
+            elif event_class is EventSet:
+                pending[field] = event.value
+                results.append(None)
+            elif len(objects):
+                _fill(objects, pending, field)
+                column = getattr(objects, field)
+                results.append(column.copy() if field != 's' else list(column))
+            else:
+                results.append(None)
+        _fill(objects, pending)
+        return results
+
 
 class IntHandler(NullHandler):
+    kind = E_int
+    field = 'i'
+
     def handle(self, obj, event):
         if event.kind == E_int:
             if isinstance(event, EventGet):
@@ -55,6 +222,9 @@ class IntHandler(NullHandler):
 
 
 class FloatHandler(NullHandler):
+    kind = E_float
+    field = 'f'
+
     def handle(self, obj, event):
         if event.kind == E_float:
             if isinstance(event, EventGet):
@@ -66,6 +236,9 @@ class FloatHandler(NullHandler):
 
 
 class StrHandler(NullHandler):
+    kind = E_str
+    field = 's'
+
     def handle(self, obj, event):
         if event.kind == E_str:
             if isinstance(event, EventGet):
@@ -73,4 +246,74 @@ class StrHandler(NullHandler):
             elif isinstance(event, EventSet):
                 obj.s = event.value
         else:
-            return super().handle(obj, event)
\ No newline at end of file
+            return super().handle(obj, event)
+
+
+class DispatchTable:
+    """A handler chain compiled into a lookup by event class and kind.
+
+    table = DispatchTable(IntHandler(FloatHandler(StrHandler(NullHandler()))))
+    table.handle(obj, EventGet(int))
+
+    Gives the same results as chain.handle(obj, event). The first handler
+    of a kind in the chain wins, unhandled events return None. Events of
+    other classes, and everything past a handler with its own handle(),
+    still go through the chain. Call compile() after rebuilding the chain.
+    """
+
+    def __init__(self, chain):
+        self.compile(chain)
+
+    def compile(self, chain=None):
+        if chain is not None:
+            self.chain = chain
+        self._fields = {} # kind -> поле Object, одно и для EventGet, и для EventSet
+        self._default = None
+        node = self.chain
+        while node is not None:
+            handle = type(node).handle
+            if handle in _TYPED_HANDLES:
+                self._fields.setdefault(node.kind, node.field)
+            elif handle is not NullHandler.handle:
+                # Дальше этого звена таблица не заглядывает
+                self._default = node.handle
+                break
+            node = node.successor
+
+    def handle(self, obj, event):
+        event_class = type(event)
+        if event_class is EventGet:
+            field = self._fields.get(event.kind)
+            if field is not None:
+                return getattr(obj, field)
+        elif event_class is EventSet:
+            field = self._fields.get(event.kind)
+            if field is not None:
+                setattr(obj, field, event.value)
+                return None
+        else:
+            return self.chain.handle(obj, event)
+        if self._default is not None:
+            return self._default(obj, event)
+
+
+_TYPED_HANDLES = {IntHandler.handle, FloatHandler.handle, StrHandler.handle}
+
+
+def _results(values):
+    for value in values:
+        if value is not None:
+            return values
+    return None
+
+
+def _fill(store, pending, field=None):
+    # Записывает отложенные EventSet в колонки: одна операция на колонку
+    for name in ([field] if field is not None else list(pending)):
+        if name in pending:
+            value = pending.pop(name)
+            if name == 's':
+                store.s[:] = [value] * len(store)
+            else:
+                store._fit(name, value)
+                getattr(store, name)[:] = value
@@ -0,0 +1,159 @@
+"""Asyncio handler chains for my_chain.
+
+Handlers may define `async def handle`. Sync and async handlers mix
+freely in one chain: a sync handler that passes an event on simply
+returns its successor's coroutine, and `resolve` awaits whatever the
+chain returns.
+
+    chain = IntHandler(StoreHandler(E_str, 's', store, NullHandler()))
+    async with ChainRunner(chain, concurrency=8, queue_size=256) as runner:
+        results = await runner.handle_all(pairs)
+
+ChainRunner runs at most `concurrency` events at once and blocks
+`submit` while `queue_size` events are waiting, so a slow handler slows
+producers down instead of piling up work. Events on the same object are
+handled in submission order.
+"""
+import asyncio
+import inspect
+
+from my_chain import EventSet, NullHandler
+
+
+async def resolve(result):
+    """Await `result` (repeatedly) if it is awaitable, else return it."""
+    while inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def handle_async(chain, obj, event):
+    return await resolve(chain.handle(obj, event))
+
+
+class AsyncNullHandler(NullHandler):
+    """Base for handlers with `async def handle`."""
+
+    async def handle(self, obj, event):
+        return await resolve(super().handle(obj, event))
+
+
+class MemoryStore:
+    """In-process stand-in for a value store reached over a socket.
+
+    Every call waits `latency` seconds; `calls` counts them.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.values = {}
+        self.calls = 0
+
+    async def get(self, key, default=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.values.get(key, default)
+
+    async def set(self, key, value):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        self.values[key] = value
+
+
+class StoreHandler(AsyncNullHandler):
+    """Handles one kind through a store, keeping obj.<field> in sync.
+
+    EventSet writes the value to the object and persists it; EventGet
+    fetches it from the store (falling back to the object's value).
+    """
+
+    def __init__(self, kind, field, store, successor=None, key=id):
+        super().__init__(successor)
+        self.kind = kind
+        self.field = field
+        self.store = store
+        self.key = key
+
+    async def handle(self, obj, event):
+        if event.kind != self.kind:
+            return await super().handle(obj, event)
+        key = (self.key(obj), self.field)
+        if isinstance(event, EventSet):
+            setattr(obj, self.field, event.value)
+            await self.store.set(key, event.value)
+        else:
+            value = await self.store.get(key, getattr(obj, self.field))
+            setattr(obj, self.field, value)
+            return value
+
+
+class ChainRunner:
+    """Run events through a chain concurrently, with backpressure."""
+
+    def __init__(self, chain, concurrency=8, queue_size=256):
+        self.chain = chain
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self._queue = None
+        self._workers = []
+        self._last = {} # id(obj) -> future of the object's latest event
+
+    async def start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+            self._workers = [asyncio.ensure_future(self._work())
+                             for _ in range(self.concurrency)]
+
+    async def close(self):
+        """Finish the queued events and stop the workers."""
+        if self._queue is None:
+            return
+        await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._queue = None
+        self._workers = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def submit(self, obj, event):
+        """Queue an event, waiting while the queue is full; return its future."""
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        previous = self._last.get(id(obj))
+        self._last[id(obj)] = future
+        await self._queue.put((obj, event, previous, future))
+        return future
+
+    async def handle(self, obj, event):
+        return await (await self.submit(obj, event))
+
+    async def handle_all(self, pairs):
+        """Handle (obj, event) pairs; results come back in the same order."""
+        futures = [await self.submit(obj, event) for obj, event in pairs]
+        return await asyncio.gather(*futures)
+
+    async def _work(self):
+        while True:
+            obj, event, previous, future = await self._queue.get()
+            try:
+                if previous is not None:
+                    # The queue is FIFO: the previous event was already taken by another worker
+                    await asyncio.wait([previous])
+                result = await handle_async(self.chain, obj, event)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                if self._last.get(id(obj)) is future:
+                    del self._last[id(obj)]
+                self._queue.task_done()
@@ -1,42 +1,244 @@
 from abc import ABC, abstractmethod
-import copy
+from array import array
+import heapq
+import itertools
+from collections.abc import MutableMapping
+from operator import add, index, itemgetter
+import weakref
+
+import numpy as np
+
+
+STAT_NAMES = ("HP", "MP", "SP", "Strength", "Perception", "Endurance",
+              "Charisma", "Intelligence", "Agility", "Luck")
+STAT_INDEX = {name: index for index, name in enumerate(STAT_NAMES)}
+
+_layer_classes = {}
+
+
+def _layer(cls):
+    """(foldable, delta row, positive) of a class in an effect chain.
+
+    A layer is foldable when it only adds its stat_delta to the layer
+    below it; the delta row is that stat_delta laid out by STAT_NAMES.
+    Heroes and other classes are not foldable.
+    """
+    layer = _layer_classes.get(cls)
+    if layer is None:
+        stat_delta = getattr(cls, "stat_delta", None)
+        foldable = (issubclass(cls, StatDeltaMixin)
+                    and issubclass(cls, (AbstractPositive, AbstractNegative))
+                    and stat_delta is not None
+                    and cls.get_stats is StatDeltaMixin.get_stats
+                    and cls.get_positive_effects is StatDeltaMixin.get_positive_effects
+                    and cls.get_negative_effects is StatDeltaMixin.get_negative_effects)
+        row = tuple((stat_delta or {}).get(name, 0) for name in STAT_NAMES)
+        layer = _layer_classes[cls] = (foldable, row, issubclass(cls, AbstractPositive))
+    return layer
+
+
+class HeroStats(MutableMapping):
+    """Hero stats as a fixed array of 64-bit integers laid out by STAT_NAMES.
+
+    Behaves like the old stats dict, except that stats can be changed but
+    never added or removed, and only to whole numbers: assigning a float
+    raises TypeError instead of silently truncating it.
+    """
+    __slots__ = ("_values",)
+
+    def __init__(self, values):
+        self._values = array("q", values)
+
+    def __getitem__(self, name):
+        return self._values[STAT_INDEX[name]]
+
+    def __setitem__(self, name, value):
+        try:
+            value = index(value)
+        except TypeError:
+            raise TypeError("hero stats are whole numbers, got %r for %r"
+                            % (value, name)) from None
+        self._values[STAT_INDEX[name]] = value
+
+    def __delitem__(self, name):
+        raise TypeError("hero stats cannot be removed")
+
+    def __iter__(self):
+        return iter(STAT_NAMES)
+
+    def __len__(self):
+        return len(STAT_NAMES)
+
+    def copy(self):
+        return dict(zip(STAT_NAMES, self._values))
+
+    def __repr__(self):
+        return repr(self.copy())
 
 
 class Hero:
+    __slots__ = ("stats", "positive_effects", "negative_effects")
+
     def __init__(self):
-        self.positive_effects = []
-        self.negative_effects = []
-        
-        self.stats = {
-            "HP": 128,
-            "MP": 42,
-            "SP": 100,
-            
-            "Strength": 15,
-            "Perception": 4,
-            "Endurance": 8,
-            "Charisma": 2,
-            "Intelligence": 3,
-            "Agility": 8,
-            "Luck": 1
-        } 
-        
+        self.positive_effects = ()
+        self.negative_effects = ()
+
+        self.stats = HeroStats((
+            128, # HP
+            42,  # MP
+            100, # SP
+
+            15,  # Strength
+            4,   # Perception
+            8,   # Endurance
+            2,   # Charisma
+            3,   # Intelligence
+            8,   # Agility
+            1,   # Luck
+        ))
+
     def get_positive_effects(self):
-        return self.positive_effects
-    
+        return list(self.positive_effects)
+
     def get_negative_effects(self):
-        return self.negative_effects
+        return list(self.negative_effects)
+
+
+def _base_stats(node):
+    # Характеристики, с которых начинается цепочка: героя или эффекта,
+    # который не сводится к stat_delta
+    if isinstance(node, AbstractEffect):
+        return node.get_stats()
+    return node.stats
+
 
+class _Chain:
+    """Version shared by effect layers stacked on one another.
+
+    A layer inherits the _Chain of the effect it is created on; giving any
+    layer a new `base` bumps the version, which makes every stack compiled
+    across that layer stale.
+    """
+    __slots__ = ("version",)
+
+    def __init__(self):
+        self.version = 0
+
+
+class _Stack:
+    """Summed stat deltas and effect names of the stat_delta layers above
+    a root. Equal stacks are shared while some cache still uses them."""
+    __slots__ = ("delta", "positive", "negative", "__weakref__")
+
+    def __init__(self, delta, positive, negative):
+        self.delta = delta
+        self.positive = positive
+        self.negative = negative
+
+
+_stacks = weakref.WeakValueDictionary()
+_EMPTY_STACK = _Stack((0,) * len(STAT_NAMES), (), ())
+
+
+def _intern_stack(delta, positive, negative):
+    key = (delta, positive, negative)
+    stack = _stacks.get(key)
+    if stack is None:
+        stack = _stacks[key] = _Stack(delta, positive, negative)
+    return stack
+
+
+def _fresh(cache):
+    # За корнем и стеком идут пары (цепочка, её версия при компиляции)
+    for i in range(2, len(cache), 2):
+        if cache[i].version != cache[i + 1]:
+            return False
+    return True
+
+
+class AbstractEffect(ABC):
+    """Base of the hero decorators.
+
+    A stat_delta layer that is asked for its stats or effects caches
+    `_cache`: the Hero or opaque effect the chain starts from, the shared
+    _Stack of the layers above it, and the version of every _Chain those
+    layers belong to. Only the queried layer
+    keeps a cache, and it holds no references to the layers it covers, so
+    short-lived wrappers around a long-lived chain leave nothing behind.
+    """
+    __slots__ = ("_base", "_chain", "_cache")
 
-class AbstractEffect(Hero, ABC):
     def __init__(self, base=None):
-        self.stats = []
-        self.positive_effects = []
-        self.negative_effects = []
+        self._cache = None
         if isinstance(base, AbstractEffect):
-            self.base = base
+            self._base, self._chain = base, base._chain
         else:
-            self.base = Hero()
+            self._base, self._chain = Hero(), _Chain()
+
+    @property
+    def base(self):
+        return self._base
+
+    @base.setter
+    def base(self, base):
+        self._base = base
+        self._chain.version += 1
+
+    def _compiled(self):
+        cache = self._cache
+        if(cache is not None and cache[2].version == cache[3]
+           and (len(cache) == 4 or _fresh(cache))):
+            return cache
+        cache = self._cache = self._compile()
+        return cache
+
+    def _compile(self):
+        """(root, _Stack, chain, version, ...) of this layer; stops at the
+        nearest layer below with a fresh cache."""
+        layers = [self]
+        chains = {self._chain: None}
+        node = self._base
+        while True:
+            if not _layer(type(node))[0]:
+                root, stack = node, _EMPTY_STACK
+                break
+            cache = node._cache
+            if cache is not None and _fresh(cache):
+                root, stack = cache[0], cache[1]
+                chains.update(dict.fromkeys(cache[2::2]))
+                break
+            layers.append(node)
+            chains[node._chain] = None
+            node = node._base
+        delta = stack.delta
+        added = ([], [])
+        for node in reversed(layers):
+            _, row, is_positive = _layer(type(node))
+            delta = tuple(map(add, delta, row))
+            added[0 if is_positive else 1].append(type(node).__name__)
+        cache = [root, _intern_stack(delta, stack.positive + tuple(added[0]),
+                                     stack.negative + tuple(added[1]))]
+        for chain in chains:
+            cache += (chain, chain.version)
+        return tuple(cache)
+
+    def _stats(self):
+        cache = self._compiled()
+        base_stats, delta = _base_stats(cache[0]), cache[1].delta
+        if type(base_stats) is HeroStats:
+            return dict(zip(STAT_NAMES, map(add, base_stats._values, delta)))
+        stats = base_stats.copy()
+        for name, value in zip(STAT_NAMES, delta):
+            if value:
+                stats[name] += value
+        return stats
+
+    def _effects(self, positive):
+        cache = self._compiled()
+        root, stack = cache[0], cache[1]
+        if positive:
+            return list(root.get_positive_effects()) + list(stack.positive)
+        return list(root.get_negative_effects()) + list(stack.negative)
     
     @abstractmethod    
     def get_stats(self): # Возвращает итоговые хараетеристики
@@ -54,6 +256,8 @@ class AbstractEffect(Hero, ABC):
 
 
 class AbstractPositive(AbstractEffect, ABC):
+    __slots__ = ()
+
     def get_negative_effects(self):
         return self.base.get_negative_effects()
 
@@ -64,52 +268,11 @@ class AbstractPositive(AbstractEffect, ABC):
     @abstractmethod
     def get_stats(self):
         pass
-    
-
-class Berserk(AbstractPositive):
-    def get_positive_effects(self):
-        positive_effects = copy.deepcopy(self.base.get_positive_effects())
-        positive_effects.append("Berserk")
-        return positive_effects
-
-    def get_stats(self):
-        if isinstance(self.base, AbstractEffect):
-            stats = copy.deepcopy(self.base.get_stats())
-        else:
-            stats = copy.deepcopy(self.base.stats)
-        stats["Strength"] +=7
-        stats["Perception"] -=3
-        stats["Endurance"] +=7
-        stats["Charisma"] -=3
-        stats["Intelligence"] -=3
-        stats["Agility"] +=7
-        stats["Luck"] +=7
-        stats["HP"] +=50
-        return stats
-
-
-class Blessing(AbstractPositive):
-    def get_positive_effects(self):
-        positive_effects = copy.deepcopy(self.base.get_positive_effects())
-        positive_effects.append("Blessing")
-        return positive_effects
-        
-    def get_stats(self):
-        if isinstance(self.base, AbstractEffect):
-            stats = copy.deepcopy(self.base.get_stats())
-        else:
-            stats = copy.deepcopy(self.base.stats)
-        stats["Strength"] +=2
-        stats["Perception"] +=2
-        stats["Endurance"] +=2
-        stats["Charisma"] +=2
-        stats["Intelligence"] +=2
-        stats["Agility"] +=2
-        stats["Luck"] +=2
-        return stats
 
 
 class AbstractNegative(AbstractEffect, ABC):
+    __slots__ = ()
+
     @abstractmethod
     def get_negative_effects(self):
         pass
@@ -122,54 +285,280 @@ class AbstractNegative(AbstractEffect, ABC):
         pass
 
 
-class Weakness(AbstractNegative):
-    def get_negative_effects(self):
-        negative_effects = copy.deepcopy(self.base.get_negative_effects())
-        negative_effects.append("Weakness")
-        return negative_effects
+class StatDeltaMixin:
+    """Effect that only adds its `stat_delta` to the stats below it.
+
+    Put it before AbstractPositive or AbstractNegative in the bases; the
+    layer is then folded into the cached delta of its chain.
+    """
+    __slots__ = ()
 
     def get_stats(self):
-        if isinstance(self.base, AbstractEffect):
-            stats = copy.deepcopy(self.base.get_stats())
+        return self._stats()
+
+    def get_positive_effects(self):
+        return self._effects(True)
+
+    def get_negative_effects(self):
+        return self._effects(False)
+    
+
+class Berserk(StatDeltaMixin, AbstractPositive):
+    __slots__ = ()
+    stat_delta = {"Strength": 7, "Perception": -3, "Endurance": 7, "Charisma": -3,
+                  "Intelligence": -3, "Agility": 7, "Luck": 7, "HP": 50}
+
+
+class Blessing(StatDeltaMixin, AbstractPositive):
+    __slots__ = ()
+    stat_delta = {"Strength": 2, "Perception": 2, "Endurance": 2, "Charisma": 2,
+                  "Intelligence": 2, "Agility": 2, "Luck": 2}
+
+
+class Weakness(StatDeltaMixin, AbstractNegative):
+    __slots__ = ()
+    stat_delta = {"Strength": -4, "Endurance": -4, "Agility": -4}
+
+
+class Curse(StatDeltaMixin, AbstractNegative):
+    __slots__ = ()
+    stat_delta = {"Strength": -2, "Perception": -2, "Endurance": -2, "Charisma": -2,
+                  "Intelligence": -2, "Agility": -2, "Luck": -2}
+
+
+class EvilEye(StatDeltaMixin, AbstractNegative):
+    __slots__ = ()
+    stat_delta = {"Luck": -10}
+
+
+class HeroBatch:
+    """Final stats of many heroes, evaluated together.
+
+    Every hero is split into its base (a Hero, or the outermost layer that
+    is not a plain stat_delta effect) and the stat_delta effects wrapped
+    around it. `stats` is the (heroes, len(STAT_NAMES)) matrix of base
+    rows plus effect counts per hero times the delta rows of the effect
+    classes; a layer that already caches its summed delta contributes it
+    instead of being walked. The effect lists are only built when
+    they are first read.
+    """
+
+    _stat_row = itemgetter(*STAT_NAMES)
+
+    def __init__(self, heroes):
+        self._heroes = heroes = list(heroes)
+        kinds = {}
+        classes = [] # строки дельт сворачиваемых классов, по столбцам
+        owners = array("q")  # герой и столбец класса для каждого слоя
+        columns = array("q")
+        cached = array("q")  # герои с готовым стеком и дельты этих стеков
+        cached_deltas = array("q")
+        self._base_stats = base_stats = []
+        get_kind = kinds.get
+        add_owner, add_column = owners.append, columns.append
+        add_cached, add_cached_delta = cached.append, cached_deltas.extend
+        add_base = base_stats.append
+        for i, hero in enumerate(heroes):
+            node = hero
+            while True:
+                cls = type(node)
+                kind = get_kind(cls)
+                if kind is None:
+                    # Столбец класса в матрице дельт или -1, если слой не сворачивается
+                    foldable, row, _ = _layer(cls)
+                    kind = kinds[cls] = len(classes) if foldable else -1
+                    if foldable:
+                        classes.append(row)
+                if kind < 0:
+                    break
+                cache = node._cache
+                if cache is not None and _fresh(cache):
+                    # Слой уже хранит сумму дельт всех слоёв под ним
+                    add_cached(i)
+                    add_cached_delta(cache[1].delta)
+                    node = cache[0]
+                else:
+                    add_owner(i)
+                    add_column(kind)
+                    node = node._base
+            add_base(_base_stats(node))
+
+        count, width = len(heroes), len(STAT_NAMES)
+        if all(type(stats) is HeroStats for stats in base_stats):
+            stats = np.frombuffer(b"".join(stats._values for stats in base_stats),
+                                  dtype=np.int64).reshape(count, width).copy()
         else:
-            stats = copy.deepcopy(self.base.stats)
-        stats["Strength"] -=4
-        stats["Endurance"] -=4
-        stats["Agility"] -=4
+            row = self._stat_row
+            stats = np.array([tuple(stats._values) if type(stats) is HeroStats else row(stats)
+                              for stats in base_stats]).reshape(count, width)
+        if classes:
+            deltas = np.array(classes, dtype=np.int64)
+            counts = np.bincount(np.frombuffer(owners, dtype=np.int64) * len(classes)
+                                 + np.frombuffer(columns, dtype=np.int64),
+                                 minlength=count * len(classes))
+            stats += counts.reshape(count, len(classes)) @ deltas
+        if cached:
+            stats[np.frombuffer(cached, dtype=np.int64)] += np.frombuffer(
+                cached_deltas, dtype=np.int64).reshape(-1, width)
+        self.stats = stats
+        self._positive_effects = self._negative_effects = None
+
+    def __len__(self):
+        return len(self.stats)
+
+    def get_stats(self, i):
+        """Stats of hero i as the dict its own get_stats() returns."""
+        stats = self._base_stats[i].copy()
+        stats.update(zip(STAT_NAMES, self.stats[i].tolist()))
         return stats
 
+    def get_positive_effects(self, i):
+        return self._heroes[i].get_positive_effects()
 
-class Curse(AbstractNegative):
-    def get_negative_effects(self):
-        negative_effects = copy.deepcopy(self.base.get_negative_effects())
-        negative_effects.append("Curse")
-        return negative_effects
+    def get_negative_effects(self, i):
+        return self._heroes[i].get_negative_effects()
 
-    def get_stats(self):
-        if isinstance(self.base, AbstractEffect):
-            stats = copy.deepcopy(self.base.get_stats())
+    @property
+    def positive_effects(self):
+        """Positive effect lists of all heroes, built on first access."""
+        if self._positive_effects is None:
+            self._positive_effects = [hero.get_positive_effects() for hero in self._heroes]
+        return self._positive_effects
+
+    @property
+    def negative_effects(self):
+        """Negative effect lists of all heroes, built on first access."""
+        if self._negative_effects is None:
+            self._negative_effects = [hero.get_negative_effects() for hero in self._heroes]
+        return self._negative_effects
+
+
+class ManagedHero:
+    """A hero together with the effects an EffectManager keeps on it.
+
+    Reads like an effect chain: get_stats() and the effect lists see the
+    hero's own stats and effects plus every active managed effect, in the
+    order they were applied. Thanks to `stats` it can be assigned as the
+    `base` of an ordinary decorator chain (the constructor, like before,
+    only keeps effects as a base).
+    """
+    __slots__ = ("hero", "_effects", "_delta")
+
+    def __init__(self, hero):
+        self.hero = hero
+        self._effects = {} # handle -> класс эффекта, в порядке наложения
+        self._delta = [0] * len(STAT_NAMES)
+
+    def _add(self, handle, effect_class, sign=1):
+        for name, value in effect_class.stat_delta.items():
+            self._delta[STAT_INDEX[name]] += sign * value
+        if sign > 0:
+            self._effects[handle] = effect_class
         else:
-            stats = copy.deepcopy(self.base.stats)
-        stats["Strength"] -=2
-        stats["Perception"] -=2
-        stats["Endurance"] -=2
-        stats["Charisma"] -=2
-        stats["Intelligence"] -=2
-        stats["Agility"] -=2
-        stats["Luck"] -=2
+            del self._effects[handle]
+
+    @property
+    def stats(self):
+        return self.get_stats()
+
+    def get_stats(self):
+        base = _base_stats(self.hero)
+        if type(base) is HeroStats:
+            return dict(zip(STAT_NAMES, map(add, base._values, self._delta)))
+        stats = base.copy()
+        for name, value in zip(STAT_NAMES, self._delta):
+            if value:
+                stats[name] += value
         return stats
 
+    def get_positive_effects(self):
+        return self.hero.get_positive_effects() + [
+            effect_class.__name__ for effect_class in self._effects.values()
+            if issubclass(effect_class, AbstractPositive)]
 
-class EvilEye(AbstractNegative):
     def get_negative_effects(self):
-        negative_effects = copy.deepcopy(self.base.get_negative_effects())
-        negative_effects.append("EvilEye")
-        return negative_effects
+        return self.hero.get_negative_effects() + [
+            effect_class.__name__ for effect_class in self._effects.values()
+            if issubclass(effect_class, AbstractNegative)]
 
-    def get_stats(self):
-        if isinstance(self.base, AbstractEffect):
-            stats = copy.deepcopy(self.base.get_stats())
-        else:
-            stats = copy.deepcopy(self.base.stats)
-        stats["Luck"] -=10
-        return stats
\ No newline at end of file
+
+class EffectManager:
+    """Expiring effects on many heroes, driven by one timer heap.
+
+        manager = EffectManager()
+        handle = manager.apply(hero, Berserk, duration=10)
+        manager.tick(now=12)             # Berserk expires
+        manager.view(hero).get_stats()
+
+    Applying or removing an effect costs O(1) plus O(log n) in the heap,
+    wherever the effect sits in the hero's stack. tick() only touches the
+    effects that expire.
+    """
+
+    def __init__(self, now=0):
+        self.now = now
+        self._heroes = {}
+        self._handles = {} # handle -> (ManagedHero, класс эффекта, время истечения)
+        self._timers = []  # (время истечения, handle)
+        self._stale = 0
+        self._next_handle = itertools.count()
+
+    def view(self, hero):
+        """The ManagedHero of `hero`, created on first use."""
+        managed = self._heroes.get(hero)
+        if managed is None:
+            managed = self._heroes[hero] = ManagedHero(hero)
+        return managed
+
+    def apply(self, hero, effect_class, duration=None):
+        """Put an effect on `hero` for `duration` time units (forever if None)."""
+        if not _layer(effect_class)[0]:
+            raise TypeError("%s is not an additive stat_delta effect" % effect_class.__name__)
+        managed = self.view(hero)
+        handle = next(self._next_handle)
+        managed._add(handle, effect_class)
+        expires = None if duration is None else self.now + duration
+        self._handles[handle] = (managed, effect_class, expires)
+        if expires is not None:
+            heapq.heappush(self._timers, (expires, handle))
+        return handle
+
+    def remove(self, handle):
+        """Remove an effect early; return False if it is already gone."""
+        entry = self._handles.pop(handle, None)
+        if entry is None:
+            return False
+        managed, effect_class, expires = entry
+        managed._add(handle, effect_class, -1)
+        if expires is None:
+            return True
+        # Запись в куче остаётся и пропускается при tick()
+        self._stale += 1
+        if self._stale > 64 and self._stale * 2 > len(self._timers):
+            self._timers = [timer for timer in self._timers if timer[1] in self._handles]
+            heapq.heapify(self._timers)
+            self._stale = 0
+        return True
+
+    def tick(self, now):
+        """Advance the clock and expire effects; return [(hero, effect class), ...]."""
+        self.now = now
+        expired = []
+        timers = self._timers
+        while timers and timers[0][0] <= now:
+            _, handle = heapq.heappop(timers)
+            entry = self._handles.pop(handle, None)
+            if entry is None:
+                self._stale -= 1
+                continue
+            managed, effect_class, _ = entry
+            managed._add(handle, effect_class, -1)
+            expired.append((managed.hero, effect_class))
+        return expired
+
+    def detach(self, hero):
+        """Drop `hero` and all its managed effects."""
+        managed = self._heroes.pop(hero, None)
+        if managed is not None:
+            for handle in list(managed._effects):
+                self.remove(handle)
@@ -1,18 +1,34 @@
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Sequence, Set
+import itertools
+import time
+
+
+class Engine:
+    pass
 
 
 class ObservableEngine(Engine):
-    def __init__(self): 
+    def __init__(self, dispatcher=None): 
         self.__subscribers = set() # При инициализации множество подписчиков звдвется пустым
+        self.dispatcher = dispatcher # Если задан, уведомления доставляются асинхронно через него
     
     def subscribe(self, subscriber):
         self.__subscribers.add(subscriber) # Для того чтобы подмисать пользователя, он добавляется во множество подписчиков
+        if self.dispatcher is not None:
+            self.dispatcher.subscribe(subscriber)
         
     def unsubscribe(self, subscriber=None):
         if (subscriber in self.__subscribers):
             self.__subscribers.remove(subscriber) # Удаление подписчика из списка
+            if self.dispatcher is not None:
+                self.dispatcher.unsubscribe(subscriber)
         
     def notify(self, message):
+        if self.dispatcher is not None:
+            self.dispatcher.publish(message)
+            return
         for subscriber in self.__subscribers:
             subscriber.update(message) # Отправка уведомления всем подписчикам
 
@@ -22,19 +38,176 @@ class AbstractObserver(ABC):
     def update(self, message):
         pass
 
+    def update_many(self, messages):
+        for message in messages:
+            self.update(message)
+
+
+_SCALARS = frozenset((str, int, float, bool, bytes, type(None)))
+
+
+def _canonical(value):
+    # Хешируемый ключ, равный для равных (==) сообщений. Каждый контейнер
+    # помечается своим видом, поэтому [1, 2] и (list, (1, 2)) не совпадут,
+    # а set и равный ему frozenset дают один ключ
+    if type(value) in _SCALARS:
+        return value
+    if isinstance(value, dict):
+        return dict, frozenset((key if type(key) in _SCALARS else _canonical(key),
+                                item if type(item) in _SCALARS else _canonical(item))
+                               for key, item in value.items())
+    if isinstance(value, list):
+        return list, tuple(_canonical(item) for item in value)
+    if isinstance(value, tuple):
+        return tuple, tuple(_canonical(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return set, frozenset(_canonical(item) for item in value)
+    hash(value)
+    return value
+
+
+_NO_KEY = object()
+
+
+class AchievementStore:
+    """Distinct messages in arrival order, deduplicated in O(1).
+
+    With `max_size` the oldest messages are dropped once there are more;
+    with `max_age` (seconds of `clock`) messages older than that are.
+    Messages that cannot be hashed take part in both limits and in the
+    order like the others, but are compared one by one.
+    """
+
+    def __init__(self, max_size=None, max_age=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.clock = clock
+        self._messages = OrderedDict() # ключ -> (сообщение, время добавления)
+        self._unhashable = {} # ключ (_NO_KEY, номер) -> сообщение без ключа
+        self._numbers = itertools.count()
+
+    def _key(self, message):
+        try:
+            return _canonical(message)
+        except TypeError:
+            return _NO_KEY
+
+    def add(self, message):
+        """Store `message` unless an equal one is stored; return True if added."""
+        if self.max_age is not None:
+            self.evict()
+        key = self._key(message)
+        if key is _NO_KEY:
+            if message in self._unhashable.values():
+                return False
+            key = (_NO_KEY, next(self._numbers))
+            self._unhashable[key] = message
+        elif key in self._messages:
+            return False
+        self._messages[key] = (message, self.clock())
+        while self.max_size is not None and len(self._messages) > self.max_size:
+            self._drop_oldest()
+        return True
+
+    def _drop_oldest(self):
+        key, _ = self._messages.popitem(last=False)
+        if self._unhashable:
+            self._unhashable.pop(key, None)
+
+    def evict(self):
+        """Drop the messages older than max_age."""
+        if self.max_age is None:
+            return
+        oldest = self.clock() - self.max_age
+        while self._messages:
+            _, added = next(iter(self._messages.values()))
+            if added >= oldest:
+                break
+            self._drop_oldest()
+
+    def __contains__(self, message):
+        key = self._key(message)
+        if key is _NO_KEY:
+            return message in self._unhashable.values()
+        return key in self._messages
+
+    def __iter__(self):
+        for message, _ in self._messages.values():
+            yield message
+
+    def __len__(self):
+        return len(self._messages)
+
+
+class _StoreView:
+    # Живое представление хранилища только для чтения
+    __slots__ = ("_store",)
+
+    def __init__(self, store):
+        self._store = store
+
+    def __contains__(self, message):
+        return message in self._store
+
+    def __iter__(self):
+        return iter(self._store)
+
+    def __len__(self):
+        return len(self._store)
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, list(self._store))
+
+
+class _AchievementSet(_StoreView, Set):
+    __slots__ = ()
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)
+
+
+class _AchievementList(_StoreView, Sequence):
+    __slots__ = ()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._store)[index]
+        if index < 0:
+            index += len(self._store)
+        if not 0 <= index < len(self._store):
+            raise IndexError("achievement index out of range")
+        return next(itertools.islice(self._store, index, None))
+
+    def __eq__(self, other):
+        if isinstance(other, (list, _AchievementList)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
 
 class ShortNotificationPrinter(AbstractObserver):
-    def __init__(self):
-        self.achievements = set()
+    def __init__(self, max_size=None, max_age=None):
+        self.store = AchievementStore(max_size, max_age)
+
+    @property
+    def achievements(self):
+        """Live read-only set view of the stored titles; change them through `store`."""
+        return _AchievementSet(self.store)
 
     def update(self, message):
-        self.achievements.add(message['title'])
+        self.store.add(message['title'])
 
 
 class FullNotificationPrinter(AbstractObserver):
-    def __init__(self):
-        self.achievements = list()
+    def __init__(self, max_size=None, max_age=None):
+        self.store = AchievementStore(max_size, max_age)
+
+    @property
+    def achievements(self):
+        """Live read-only list view of the stored messages; change them through `store`."""
+        return _AchievementList(self.store)
 
     def update(self, message):
-        if message not in self.achievements:
-            self.achievements.append(message)
\ No newline at end of file
+        self.store.add(message)
@@ -0,0 +1,294 @@
+"""Asynchronous, batched notification dispatch for ObservableEngine.
+
+    engine = ObservableEngine(dispatcher=ThreadPoolDispatcher(workers=4))
+    engine.subscribe(FullNotificationPrinter())
+    engine.notify(message)   # returns at once
+    engine.dispatcher.drain()
+
+Published messages go into one ring log of `queue_size` entries that all
+subscribers read through their own cursor, so publishing is O(1) however
+many subscribers there are. Every subscriber is served by at most one
+pump at a time, which hands it everything that piled up since its last
+call as one `update_many(messages)` batch, or `update` per message when
+the subscriber has no `update_many` of its own.
+
+A subscriber that falls more than `queue_size` messages behind loses the
+oldest ones; they are counted as dropped. Exceptions raised by a
+subscriber are counted and do not reach the publisher or other
+subscribers; a failing `update` counts one message as failed, a failing
+`update_many` the whole batch. stats() reports delivered, dropped,
+failed and backlog per subscriber.
+
+AsyncioDispatcher runs the pumps as tasks on the running event loop
+(`update_many` may be a coroutine; publish from the loop's thread).
+ThreadPoolDispatcher runs them on worker threads, for blocking
+subscribers.
+"""
+import asyncio
+import inspect
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from my_observer import AbstractObserver
+
+
+class _Subscription:
+    __slots__ = ("subscriber", "cursor", "busy", "epoch", "delivered", "dropped", "failed",
+                 "errors", "last_error")
+
+    def __init__(self, subscriber, cursor):
+        self.subscriber = subscriber
+        self.cursor = cursor
+        self.busy = False
+        self.epoch = 0 # bumped on unsubscribe: the rest of a started batch is not delivered
+        self.delivered = self.dropped = self.failed = self.errors = 0
+        self.last_error = None
+
+
+class BatchDispatcher(ABC):
+    """Ring log and per-subscriber bookkeeping shared by the backends."""
+
+    def __init__(self, queue_size=1024, max_batch=256):
+        self.queue_size = queue_size
+        self.max_batch = max_batch
+        self._log = [None] * queue_size
+        self._head = 0 # number of the next message
+        self._subscriptions = {}
+        self._leaving = {} # unsubscribed, but their pump has not finished its batch yet
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscriber):
+        """Deliver messages published from now on to `subscriber`."""
+        with self._lock:
+            if subscriber in self._subscriptions:
+                return
+            subscription = self._leaving.pop(subscriber, None)
+            if subscription is None:
+                subscription = _Subscription(subscriber, self._head)
+            else:
+                # The old subscription's pump is still running; it carries on, no second pump
+                subscription.cursor = self._head
+            self._subscriptions[subscriber] = subscription
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscription = self._subscriptions.pop(subscriber, None)
+            if subscription is not None:
+                subscription.epoch += 1
+                if subscription.busy:
+                    self._leaving[subscriber] = subscription
+        self._settle()
+
+    def publish(self, message):
+        with self._lock:
+            self._log[self._head % self.queue_size] = message
+            self._head += 1
+        self._wake()
+
+    @abstractmethod
+    def _wake(self):
+        """Make sure the subscriptions with a backlog get pumped."""
+
+    @abstractmethod
+    def _settle(self):
+        """Wake drain() up: a pump finished or a subscription went away."""
+
+    def _ready(self):
+        """Mark idle subscriptions with a backlog busy and return them."""
+        with self._lock:
+            ready = [subscription for subscription in self._subscriptions.values()
+                     if not subscription.busy and subscription.cursor < self._head]
+            for subscription in ready:
+                subscription.busy = True
+        return ready
+
+    def _take(self, subscription):
+        """(batch, epoch) of the next batch of `subscription`, or None once
+        it has caught up."""
+        with self._lock:
+            subscriber = subscription.subscriber
+            if(self._subscriptions.get(subscriber) is not subscription
+               or subscription.cursor >= self._head):
+                subscription.busy = False
+                if self._leaving.get(subscriber) is subscription:
+                    del self._leaving[subscriber]
+                return None
+            lag = self._head - subscription.cursor
+            if lag > self.queue_size:
+                # The oldest messages were already overwritten in the ring
+                subscription.dropped += lag - self.queue_size
+                subscription.cursor = self._head - self.queue_size
+            end = min(self._head, subscription.cursor + self.max_batch)
+            batch = [self._log[number % self.queue_size]
+                     for number in range(subscription.cursor, end)]
+            subscription.cursor = end
+            return batch, subscription.epoch
+
+    def _calls(self, subscription, batch, epoch):
+        # (call, argument, message count): the whole batch at once or update per
+        # message. The inherited update_many just calls update per message, so it
+        # is bypassed: an error in one message is not charged to the whole batch
+        subscriber = subscription.subscriber
+        update_many = getattr(type(subscriber), "update_many", None)
+        if update_many is not None and update_many is not AbstractObserver.update_many:
+            calls = [(subscriber.update_many, batch, len(batch))]
+        else:
+            calls = [(subscriber.update, message, 1) for message in batch]
+        for call in calls:
+            # After an unsubscribe the rest of the batch is not delivered
+            if subscription.epoch != epoch:
+                return
+            yield call
+
+    def _done(self, subscription, count, error=None):
+        if error is None:
+            subscription.delivered += count
+        else:
+            subscription.failed += count
+            subscription.errors += 1
+            subscription.last_error = error
+
+    def backlog(self):
+        """Messages published but not yet delivered, over all subscribers."""
+        with self._lock:
+            return sum(min(self._head - subscription.cursor, self.queue_size)
+                       for subscription in self._subscriptions.values())
+
+    def _idle(self):
+        with self._lock:
+            return all(subscription.cursor >= self._head and not subscription.busy
+                       for subscription in self._subscriptions.values())
+
+    def stats(self):
+        """{subscriber: {"delivered", "dropped", "failed", "errors", "backlog"}}."""
+        with self._lock:
+            head = self._head
+            return {subscriber: {"delivered": subscription.delivered,
+                                 "dropped": subscription.dropped
+                                 + max(head - subscription.cursor - self.queue_size, 0),
+                                 "failed": subscription.failed,
+                                 "errors": subscription.errors,
+                                 "backlog": min(head - subscription.cursor, self.queue_size)}
+                    for subscriber, subscription in self._subscriptions.items()}
+
+
+class AsyncioDispatcher(BatchDispatcher):
+    """Pumps run as tasks on the event loop that publishes."""
+
+    def __init__(self, queue_size=1024, max_batch=256):
+        super().__init__(queue_size, max_batch)
+        self._wakeup = None
+        self._task = None
+        self._pumps = set()
+        self._settled = None
+
+    def _wake(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            for subscription in self._ready():
+                pump = asyncio.ensure_future(self._pump(subscription))
+                self._pumps.add(pump)
+                pump.add_done_callback(self._pumps.discard)
+
+    def _settle(self):
+        if self._settled is not None:
+            self._settled.set()
+
+    async def _pump(self, subscription):
+        try:
+            while True:
+                taken = self._take(subscription)
+                if taken is None:
+                    return
+                for call, argument, count in self._calls(subscription, *taken):
+                    try:
+                        result = call(argument)
+                        if inspect.isawaitable(result):
+                            await result
+                    except Exception as error:
+                        self._done(subscription, count, error)
+                    else:
+                        self._done(subscription, count)
+        finally:
+            self._settle()
+
+    async def drain(self):
+        """Wait until every subscriber has received everything published."""
+        if self._settled is None:
+            self._settled = asyncio.Event()
+        while not self._idle():
+            self._settled.clear()
+            await self._settled.wait()
+
+    async def close(self):
+        await self.drain()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+class ThreadPoolDispatcher(BatchDispatcher):
+    """Pumps run on a pool of worker threads."""
+
+    def __init__(self, workers=4, queue_size=1024, max_batch=256):
+        super().__init__(queue_size, max_batch)
+        self._executor = ThreadPoolExecutor(workers)
+        self._wakeup = threading.Event()
+        self._finished = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _wake(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed:
+                return
+            for subscription in self._ready():
+                self._executor.submit(self._pump, subscription)
+
+    def _settle(self):
+        with self._finished:
+            self._finished.notify_all()
+
+    def _pump(self, subscription):
+        try:
+            while True:
+                taken = self._take(subscription)
+                if taken is None:
+                    return
+                for call, argument, count in self._calls(subscription, *taken):
+                    try:
+                        call(argument)
+                    except Exception as error:
+                        self._done(subscription, count, error)
+                    else:
+                        self._done(subscription, count)
+        finally:
+            self._settle()
+
+    def drain(self, timeout=None):
+        """Wait until every subscriber has received everything published;
+        return False if `timeout` seconds passed first."""
+        with self._finished:
+            return self._finished.wait_for(self._idle, timeout)
+
+    def close(self):
+        self.drain()
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self._executor.shutdown()
@@ -1,8 +1,14 @@
 import pygame
+import numpy as np
 import random
 import math
+import functools
+import collections
+import argparse
+import time
 
 SCREEN_DIM = (800, 600)
+RENDER_FPS = 60
 
 
 class Vec2d:
@@ -44,6 +50,293 @@ class Vec2d:
     def int_pair(self):
         return int(self.x), int(self.y)
 
+
+def _basis_weights(alpha, deg):
+    weights = np.empty(alpha.shape + (deg + 1,))
+    weights[..., 0] = (1 - alpha) ** deg
+    for k in range(1, deg + 1):
+        weights[..., k] = alpha * (1 - alpha) ** (deg - k)
+    return weights
+
+
+@functools.lru_cache(maxsize=64)
+def bezier_basis(count, deg=2):
+    """(count, deg + 1) weights that `Knot` applies to one segment's controls.
+
+    Row i holds the weights of the recursive blend
+    P(a) = P[deg]*a + P(a, deg - 1)*(1 - a) at a = i / count, so the
+    matrix only depends on `count` and is shared by every knot.
+    """
+    basis = _basis_weights(np.arange(count) / count, deg)
+    basis.setflags(write=False)
+    return basis
+
+
+def knot_controls(points, segments=None):
+    """Control triples (S, 3, 2) of closed-knot segments of `points`.
+
+    Segment i is built from points i - 2, i - 1 and i; `segments` selects
+    which ones to build (all of them by default).
+    """
+    if segments is None:
+        segments = np.arange(len(points))
+    prev2 = points[segments - 2]
+    prev1 = points[segments - 1]
+    controls = np.empty((len(segments), 3, 2))
+    controls[:, 0] = (prev2 + prev1) * 0.5
+    controls[:, 1] = prev1
+    controls[:, 2] = (prev1 + points[segments]) * 0.5
+    return controls
+
+
+def step_points(points, speeds):
+    """Advance (N, 2) `points` by `speeds` in place, bouncing off SCREEN_DIM."""
+    points += speeds
+    out_x = (points[:, 0] > SCREEN_DIM[0]) | (points[:, 0] < 0)
+    out_y = (points[:, 1] > SCREEN_DIM[1]) | (points[:, 1] < 0)
+    speeds[out_x, 0] *= -1
+    speeds[out_y, 1] *= -1
+
+
+def smooth_segments(controls, count):
+    """Evaluate all segments at once: (S, 3, 2) controls -> (S, count, 2)."""
+    return bezier_basis(count, controls.shape[1] - 1) @ controls
+
+
+@functools.lru_cache(maxsize=512)
+def _point_sprite(color, radius):
+    key = tuple(255 - c for c in color[:3])
+    sprite = pygame.Surface((2 * radius, 2 * radius))
+    sprite.fill(key)
+    sprite.set_colorkey(key)
+    pygame.draw.circle(sprite, color, (radius, radius), radius)
+    return sprite
+
+
+def smooth_adaptive(controls, counts):
+    """Evaluate segment i at counts[i] samples: (S, 3, 2) -> (counts.sum(), 2)."""
+    starts = np.cumsum(counts) - counts
+    segments = np.repeat(np.arange(len(counts)), counts)
+    alpha = (np.arange(len(segments)) - starts[segments]) / counts[segments]
+    weights = _basis_weights(alpha, controls.shape[1] - 1)
+    return np.einsum("tk,tkd->td", weights, controls[segments])
+
+
+class LevelOfDetail:
+    """Per-segment sample counts driven by on-screen size and a frame budget.
+
+    A segment gets enough samples to stay within `tolerance` pixels of the
+    curve and to keep samples at most `max_span` pixels apart, capped by
+    the global count. `update` scales both limits through `quality` to
+    hold `target_frame_time` (seconds).
+    """
+
+    def __init__(self, target_frame_time=1 / 60, tolerance=0.5, max_span=12,
+                 min_quality=0.05, cooldown=15):
+        self.target_frame_time = target_frame_time
+        self.tolerance = tolerance
+        self.max_span = max_span
+        self.min_quality = min_quality
+        self.cooldown = cooldown
+        self.quality = 1.0
+        self._frame_time = None
+        self._frames_since_change = 0
+
+    def counts(self, controls, count):
+        first = controls[:, 1] - controls[:, 0]
+        second = controls[:, 2] - controls[:, 1]
+        # The blend's second derivative is 2 * (P0 - P1), so n samples keep
+        # the chords within |P0 - P1| / (4 * n**2) of the curve.
+        bend = np.hypot(first[:, 0], first[:, 1])
+        length = bend + np.hypot(second[:, 0], second[:, 1])
+        samples = np.maximum(np.sqrt(bend * self.quality / (4 * self.tolerance)),
+                             length * self.quality / self.max_span)
+        return np.clip(np.ceil(samples), 1, count).astype(int)
+
+    def update(self, frame_time):
+        """Feed the last frame time, return True when `quality` changed."""
+        if self._frame_time is None:
+            self._frame_time = frame_time
+        else:
+            self._frame_time += (frame_time - self._frame_time) * 0.1
+        self._frames_since_change += 1
+        if self._frames_since_change < self.cooldown:
+            return False
+
+        quality = self.quality
+        if self._frame_time > self.target_frame_time * 1.05:
+            quality = max(self.min_quality, quality * 0.8)
+        elif self._frame_time < self.target_frame_time * 0.75:
+            quality = min(1.0, quality * 1.25)
+        if quality == self.quality:
+            return False
+        self.quality = quality
+        self._frames_since_change = 0
+        return True
+
+
+class SimulationClock:
+    """Fixed-timestep accumulator that decouples physics from the render rate.
+
+    `advance` turns the real time of a rendered frame into a whole number of
+    simulation steps; `alpha` is how far the render time is into the next
+    step. At most `max_steps` are run per frame so a long stall does not
+    snowball into an ever longer catch-up.
+    """
+
+    def __init__(self, timestep=1 / 60, max_steps=8):
+        self.timestep = timestep
+        self.max_steps = max_steps
+        self._accumulator = 0.0
+
+    def advance(self, frame_time):
+        self._accumulator += frame_time
+        steps = int(self._accumulator // self.timestep)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self._accumulator = self.timestep * steps
+        self._accumulator -= self.timestep * steps
+        return steps
+
+    @property
+    def alpha(self):
+        return self._accumulator / self.timestep
+
+
+class TextCache:
+    """Fonts loaded on first use plus an LRU cache of rendered text surfaces.
+
+    Surfaces are keyed by (text, font, color), so labels that never change
+    are rendered once and only changed values cost a new render.
+    """
+
+    def __init__(self, max_surfaces=256):
+        self.max_surfaces = max_surfaces
+        self._fonts = {}
+        self._surfaces = collections.OrderedDict()
+
+    def font(self, name, size):
+        font = self._fonts.get((name, size))
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = self._fonts[(name, size)] = pygame.font.SysFont(name, size)
+        return font
+
+    def render(self, text, font=("courier", 24), color=(128, 128, 255)):
+        key = (text, font, color)
+        surface = self._surfaces.get(key)
+        if surface is None:
+            surface = self._surfaces[key] = self.font(*font).render(text, True, color)
+            if len(self._surfaces) > self.max_surfaces:
+                self._surfaces.popitem(last=False)
+        else:
+            self._surfaces.move_to_end(key)
+        return surface
+
+
+class FrameProfiler:
+    """Per-phase frame timings kept in a fixed-size ring buffer.
+
+    Call begin_frame() at the top of the loop, mark(phase) at the end of
+    each phase and end_frame() at the bottom. While `enabled` is False
+    every call returns after a single attribute check; toggling it takes
+    effect from the next frame.
+    """
+
+    PHASES = ("events", "simulate", "smooth", "draw", "flip")
+    COLUMNS = PHASES + ("busy", "interval", "points")
+
+    def __init__(self, capacity=600, enabled=False):
+        self.enabled = enabled
+        self._index = {column: i for i, column in enumerate(self.COLUMNS)}
+        self._samples = np.zeros((capacity, len(self.COLUMNS)))
+        self._row = np.zeros(len(self.COLUMNS))
+        self._size = 0
+        self._next = 0
+        self._in_frame = False
+        self._frame_start = None
+        self._last = 0.0
+
+    def begin_frame(self):
+        self._in_frame = self.enabled
+        if self._in_frame:
+            now = time.perf_counter()
+            self._row[:] = 0
+            if self._frame_start is not None:
+                self._row[self._index["interval"]] = now - self._frame_start
+            self._frame_start = self._last = now
+        else:
+            self._frame_start = None
+
+    def mark(self, phase):
+        if self._in_frame:
+            now = time.perf_counter()
+            self._row[self._index[phase]] += now - self._last
+            self._last = now
+
+    def add_points(self, points):
+        if self._in_frame:
+            self._row[-1] += points
+
+    def end_frame(self):
+        if self._in_frame:
+            self._row[self._index["busy"]] = time.perf_counter() - self._frame_start
+            self._samples[self._next] = self._row
+            self._next = (self._next + 1) % len(self._samples)
+            self._size = min(self._size + 1, len(self._samples))
+
+    def samples(self):
+        """Recorded rows, oldest first, one column per entry of COLUMNS."""
+        if self._size < len(self._samples):
+            return self._samples[:self._size]
+        return np.roll(self._samples, -self._next, axis=0)
+
+    def stats(self):
+        samples = self.samples()
+        if len(samples) == 0:
+            return None
+        busy = samples[:, self._index["busy"]] * 1000
+        intervals = samples[:, self._index["interval"]]
+        intervals = intervals[intervals > 0]
+        stats = {"fps": float(1 / intervals.mean()) if len(intervals) else 0.0,
+                 "points": float(samples[:, -1].mean())}
+        for q in (50, 95, 99):
+            stats["p%d" % q] = float(np.percentile(busy, q))
+        for phase in self.PHASES:
+            stats[phase] = float(samples[:, self._index[phase]].mean() * 1000)
+        return stats
+
+    def dump(self, path):
+        np.savetxt(path, self.samples(), fmt="%.6f", delimiter=",", header=",".join(self.COLUMNS),
+                   comments="")
+
+    def draw_overlay(self, display, text_cache):
+        """Draw the stats box in the top right corner, return its Rect."""
+        stats = self.stats()
+        if stats is None:
+            return None
+        # Every line changes each frame, so render directly instead of caching.
+        font = text_cache.font("courier", 16)
+        lines = ["FPS %.1f" % stats["fps"],
+                 "frame p50/95/99 %.1f/%.1f/%.1f ms" % (stats["p50"], stats["p95"], stats["p99"]),
+                 "points/frame %d" % stats["points"]]
+        lines += ["%-8s %.2f ms" % (phase, stats[phase]) for phase in self.PHASES]
+        rect = pygame.Rect(0, 0, 340, 10 + 18 * len(lines))
+        rect.topright = (display.get_width() - 10, 10)
+        display.fill((30, 30, 30), rect)
+        for i, line in enumerate(lines):
+            display.blit(font.render(line, True, (200, 200, 200)),
+                         (rect.x + 8, rect.y + 5 + 18 * i))
+        return rect
+
+
+def _int_pairs(line_points):
+    if isinstance(line_points, np.ndarray):
+        return line_points.astype(int).tolist()
+    return [p.int_pair() for p in line_points]
+
+
 class Polyline:
     def __init__(self, display, points=None, points_speeds=None):
         self.display = display
@@ -57,16 +350,20 @@ class Polyline:
                 self.speeds.append(Vec2d(each_speed[0], each_speed[1]))
 
     def draw_points(self, width=3, color=(255, 255, 255)):
-        self.draw_line(style='points', line_points=self.points, width=width, color=color)
-
-    def draw_line(self, style="points", line_points=[], width=3, color=(255, 255, 255)):
-        if style == "line":
-            for p_n in range(-1, len(line_points) - 1):
-                pygame.draw.line(self.display, color, line_points[p_n].int_pair(),
-                                line_points[p_n + 1].int_pair(), width)
-        elif style == "points":
-            for p in line_points:
-                pygame.draw.circle(self.display, color, p.int_pair(), width)
+        return self.draw_line(style='points', line_points=self.points, width=width, color=color)
+
+    def draw_line(self, style="points", line_points=[], width=3, color=(255, 255, 255),
+                  antialias=False):
+        """Draw the whole line or point set in one batch, return the dirty Rect."""
+        int_points = _int_pairs(line_points)
+        if style == "line" and len(int_points) > 1:
+            if antialias:
+                return pygame.draw.aalines(self.display, color, True, int_points)
+            return pygame.draw.lines(self.display, color, True, int_points, width)
+        elif style == "points" and len(int_points) > 0:
+            sprite = _point_sprite(tuple(color), width)
+            rects = self.display.blits([(sprite, (x - width, y - width)) for x, y in int_points])
+            return rects[0].unionall(rects[1:])
 
     def set_points(self):
         for p in range(len(self.points)):
@@ -80,55 +377,229 @@ class Polyline:
         self.points.append(Vec2d(point_to_add[0], point_to_add[1]))
         self.speeds.append(Vec2d(speed_to_add[0], speed_to_add[1]))
 
+    def pop_point(self):
+        if(len(self.points)>0 and len(self.speeds)>0):
+            self.points.pop()
+            self.speeds.pop()
+
+    def move_point(self, index, point_to_move):
+        self.points[index] = Vec2d(point_to_move[0], point_to_move[1])
+
+    def scale_speeds(self, factor):
+        self.speeds = [each_speed*factor for each_speed in self.speeds]
+
+    def _point_array(self):
+        return np.array([(p.x, p.y) for p in self.points], dtype=float).reshape(-1, 2)
+
+    def _speed_array(self):
+        return np.array([(s.x, s.y) for s in self.speeds], dtype=float).reshape(-1, 2)
+
+    def _set_arrays(self, points, speeds):
+        self.points = [Vec2d(x, y) for x, y in points.tolist()]
+        self.speeds = [Vec2d(x, y) for x, y in speeds.tolist()]
+
+
+class ArrayPolyline(Polyline):
+    """Polyline keeping points and speeds in (N, 2) float arrays.
+
+    `points` and `speeds` are still available for compatibility, as
+    read-only tuples of Vec2d: assign a whole new sequence, or use
+    add_point/pop_point/move_point/scale_speeds, to change them. Every
+    step of `set_points` is a handful of whole-array operations instead of
+    a Python loop over Vec2d objects.
+    """
+
+    def __init__(self, display, points=None, points_speeds=None):
+        self.display = display
+        self._points = np.empty((0, 2))
+        self._speeds = np.empty((0, 2))
+
+        if((points is not None) and (points_speeds is not None)):
+            self._points = np.array(points, dtype=float).reshape(-1, 2)
+            self._speeds = np.array(points_speeds, dtype=float).reshape(-1, 2)
+
+    @staticmethod
+    def _to_array(vectors):
+        if isinstance(vectors, np.ndarray):
+            return vectors.astype(float).reshape(-1, 2)
+        return np.array([(v.x, v.y) if isinstance(v, Vec2d) else v for v in vectors],
+                        dtype=float).reshape(-1, 2)
+
+    @property
+    def points(self):
+        return tuple(Vec2d(x, y) for x, y in self._points.tolist())
+
+    @points.setter
+    def points(self, points):
+        self._points = self._to_array(points)
+
+    @property
+    def speeds(self):
+        return tuple(Vec2d(x, y) for x, y in self._speeds.tolist())
+
+    @speeds.setter
+    def speeds(self, speeds):
+        self._speeds = self._to_array(speeds)
+
+    def draw_points(self, width=3, color=(255, 255, 255)):
+        return self.draw_line(style='points', line_points=self._points, width=width, color=color)
+
+    def set_points(self):
+        step_points(self._points, self._speeds)
+
+    def add_point(self, point_to_add, speed_to_add):
+        self._points = np.vstack((self._points, np.asarray(point_to_add, dtype=float)))
+        self._speeds = np.vstack((self._speeds, np.asarray(speed_to_add, dtype=float)))
+
+    def pop_point(self):
+        if(len(self._points)>0 and len(self._speeds)>0):
+            self._points = self._points[:-1]
+            self._speeds = self._speeds[:-1]
+
+    def move_point(self, index, point_to_move):
+        self._points[index] = point_to_move
+
+    def scale_speeds(self, factor):
+        self._speeds *= factor
+
+    def _point_array(self):
+        return self._points
+
+    def _speed_array(self):
+        return self._speeds
+
+    def _set_arrays(self, points, speeds):
+        self._points = np.array(points, dtype=float).reshape(-1, 2)
+        self._speeds = np.array(speeds, dtype=float).reshape(-1, 2)
+
 
 class Knot(Polyline):
     def __init__(self, display, points=None, points_speeds=None):
         super().__init__(display, points, points_speeds) 
+        self.lod = None
+        self.knot_points = np.empty((0, 2))
+        self._segments = None
+        self._knot_key = None
+        self._dirty = set()
+        self._prev_points = None
+        self._alpha = 1.0
+        self.evaluated = 0
+
+    def mark_dirty(self, point_idx=None):
+        """Schedule recomputation of the segments a changed point affects.
+
+        Point i feeds segments i, i + 1 and i + 2; `None` invalidates the
+        whole knot. Call it after changing `points` from the outside.
+        """
+        if point_idx is None or self._segments is None:
+            self._knot_key = None
+        else:
+            n = len(self._segments)
+            self._dirty.update((point_idx + k) % n for k in range(3))
+
+    def interpolate(self, alpha):
+        """Render the knot `alpha` of the way from the previous step to the current one."""
+        if alpha != self._alpha:
+            self._alpha = alpha
+            if self._prev_points is not None:
+                self.mark_dirty()
+
+    def _render_points(self):
+        points = self._point_array()
+        prev = self._prev_points
+        if self._alpha >= 1 or prev is None or prev.shape != points.shape:
+            return points
+        return prev + (points - prev) * self._alpha
+
+    def _drop_interpolation(self):
+        if self._prev_points is not None:
+            self._prev_points = None
+            if self._alpha < 1:
+                self.mark_dirty()
 
     def get_knot(self, count=0):
-        if len(self.points) < 3:
-            self.knot_points = []
+        points = self._render_points()
+        key = (count, None if self.lod is None else self.lod.quality)
+        self.evaluated = 0
+        if len(points) < 3 or count <= 0:
+            self._segments = None
+            self._knot_key = None
+            self._dirty.clear()
+            self.knot_points = np.empty((0, 2))
+            return
+
+        if self.lod is not None:
+            if key == self._knot_key:
+                return
+            self._segments = None
+            controls = knot_controls(points)
+            self.knot_points = smooth_adaptive(controls, self.lod.counts(controls, count))
+            self.evaluated = len(self.knot_points)
+        elif(key != self._knot_key or self._segments is None
+             or len(self._segments) != len(points)):
+            self._segments = smooth_segments(knot_controls(points), count)
+            self.evaluated = len(points) * count
+        elif self._dirty:
+            segments = np.fromiter(self._dirty, dtype=int, count=len(self._dirty))
+            self._segments[segments] = smooth_segments(knot_controls(points, segments), count)
+            self.evaluated = len(segments) * count
         else:
-            res = []
-            for i in range(-2, len(self.points) - 2):
-                ptn = []
-                ptn.append((self.points[i] + self.points[i + 1]) * 0.5)
-                ptn.append(self.points[i + 1])
-                ptn.append((self.points[i + 1] + self.points[i + 2]) * 0.5)
-                if(count > 0):
-                    res.extend(self._get_points(ptn, count))
-            self.knot_points = res
-
-    def _get_points(self, vec2d_points, count):
-        alpha = 1 / count
-        res = []
-        for i in range(count):
-            res.append(self._get_point(vec2d_points, i * alpha))
-        return res
-
-    def _get_point(self, vec2d_points, alpha, deg=None):
-        if deg is None:
-            deg = len(vec2d_points) - 1
-        if deg == 0:
-            return vec2d_points[0]
-        return vec2d_points[deg]*alpha + self._get_point(vec2d_points, alpha, deg - 1)*(1 - alpha)
-
-    def draw_knot(self, width=3, color=(255, 255, 255)):
-        super().draw_line(style='line', line_points=self.knot_points, width=width, color=color)
+            return
+        self._knot_key = key
+        self._dirty.clear()
+        if self._segments is not None:
+            self.knot_points = self._segments.reshape(-1, 2)
 
-    def set_points(self, count):
+    def draw_points(self, width=3, color=(255, 255, 255)):
+        return self.draw_line(style='points', line_points=self._render_points(), width=width,
+                              color=color)
+
+    def draw_knot(self, width=3, color=(255, 255, 255), antialias=False):
+        return super().draw_line(style='line', line_points=self.knot_points, width=width,
+                                 color=color, antialias=antialias)
+
+    def move_points(self):
+        self._prev_points = self._point_array().copy()
         super().set_points()
+        self.mark_dirty()
+
+    def set_points(self, count):
+        self.move_points()
         self.get_knot(count=count)
 
     def add_point(self, point_to_add, speed_to_add, count):
+        self._drop_interpolation()
         super().add_point(point_to_add, speed_to_add)
+        n = len(self._point_array())
+        if(self._segments is not None and len(self._segments) == n - 1
+           and self._segments.shape[1] == count):
+            self._segments = np.concatenate((self._segments, np.empty((1, count, 2))))
+            self.mark_dirty(n - 1)
+        else:
+            self.mark_dirty()
         self.get_knot(count=count)
 
     def pop_point(self, count):
-        if(len(self.points)>0 and len(self.speeds)>0):
-            self.points.pop()
-            self.speeds.pop()
-            self.get_knot(count=count)
+        self._drop_interpolation()
+        super().pop_point()
+        if(self._segments is not None
+           and len(self._segments) == len(self._point_array()) + 1):
+            self._segments = self._segments[:-1]
+            self._dirty = {i for i in self._dirty if i < len(self._segments)}
+            self._dirty.update((0, 1))
+        else:
+            self.mark_dirty()
+        self.get_knot(count=count)
+
+    def move_point(self, index, point_to_move, count):
+        self._drop_interpolation()
+        super().move_point(index, point_to_move)
+        self.mark_dirty(index)
+        self.get_knot(count=count)
+
+
+class ArrayKnot(Knot, ArrayPolyline):
+    pass
 
 class KnotDisplay(Knot):
     def __init__(self, display, new_knot=None):
@@ -143,8 +614,15 @@ class KnotDisplay(Knot):
 
         self._hue = 0
         self._color = pygame.Color(0)
+        self._drawn_rects = []
+        self._full_redraw = True
+        self.lod = None
+        self.clock = SimulationClock()
+        self.profiler = None
+        self.text_cache = TextCache()
 
     def add_knot(self, knot_to_add):
+        knot_to_add.lod = self.lod
         self.knot_list.append(knot_to_add)
         self._max_idx += 1
         self._idx = self._max_idx
@@ -167,23 +645,94 @@ class KnotDisplay(Knot):
     def get_current_idx(self):
         return self._idx
 
+    def set_lod(self, lod):
+        self.lod = lod
+        for each_knot in self.knot_list:
+            each_knot.lod = lod
+
+    def invalidate(self):
+        self._full_redraw = True
+
     def draw_all(self, count):
-        self.display.fill((0, 0, 0))
+        """Redraw the knots and return the Rects to pass to display.update().
+
+        Only the areas covered in the previous frame are cleared; the whole
+        screen is cleared and returned after invalidate(), or when the dirty
+        areas add up to more than the screen anyway.
+        """
+        screen = self.display.get_rect()
+        screen_area = screen.w * screen.h
+        if sum(rect.w * rect.h for rect in self._drawn_rects) >= screen_area:
+            self._full_redraw = True
+        if self._full_redraw:
+            self.display.fill((0, 0, 0))
+        else:
+            for rect in self._drawn_rects:
+                self.display.fill((0, 0, 0), rect)
+
+        drawn_rects = []
         if(self._max_idx >= 0):
 
             self._hue = (self._hue + 1) % 360
             self._color.hsla = (self._hue, 100, 50, 100)
+            drawn_rects = self._draw_knots(count)
+
+        dirty_rects = self._drawn_rects
+        self._drawn_rects = [rect for rect in drawn_rects if rect is not None]
+        dirty_rects.extend(self._drawn_rects)
+        if(self._full_redraw
+           or sum(rect.w * rect.h for rect in dirty_rects) >= screen_area):
+            self._full_redraw = False
+            return [screen]
+        return dirty_rects
+
+    def _draw_knots(self, count):
+        drawn_rects = []
+        for each_knot in self.knot_list:
+            drawn_rects.append(each_knot.draw_points(color=self._color))
+            each_knot.get_knot(count=count)
+            drawn_rects.append(each_knot.draw_knot(color=self._color))
+        if self.profiler is not None and self.profiler.enabled:
+            self.profiler.add_points(sum(each_knot.evaluated for each_knot in self.knot_list))
+        return drawn_rects
+
+    def frame_state(self):
+        """(points, speeds) arrays of every knot, e.g. for recording.
+
+        The points are the ones drawn in this frame, i.e. interpolated
+        between simulation steps, so a replay shows exactly what was on
+        screen.
+        """
+        return [(each_knot._render_points(), each_knot._speed_array())
+                for each_knot in self.knot_list]
+
+    def move_all(self):
+        if(self._max_idx >= 0):
+            for each_knot in self.knot_list:
+                each_knot.move_points()
 
+    def smooth_all(self, count):
+        if(self._max_idx >= 0):
             for each_knot in self.knot_list:
-                each_knot.draw_points(color=self._color)
                 each_knot.get_knot(count=count)
-                each_knot.draw_knot(color=self._color)
-        
+        if self.profiler is not None and self.profiler.enabled:
+            self.profiler.add_points(sum(each_knot.evaluated for each_knot in self.knot_list))
+            self.profiler.mark("smooth")
 
     def set_all(self, count):
-        if(self._max_idx >= 0):
-            for each_knot in self.knot_list:
-                each_knot.set_points(count=count)
+        self.move_all()
+        self.smooth_all(count)
+
+    def advance(self, frame_time, count):
+        """Run the fixed-step simulation for `frame_time` seconds of real time."""
+        for _ in range(self.clock.advance(frame_time)):
+            self.move_all()
+        if self.profiler is not None:
+            self.profiler.mark("simulate")
+        alpha = self.clock.alpha
+        for each_knot in self.knot_list:
+            each_knot.interpolate(alpha)
+        self.smooth_all(count)
 
     def draw_knot(self):
         if(self._max_idx >= 0):
@@ -208,29 +757,26 @@ class KnotDisplay(Knot):
     def pop_point(self, count):
         if(self._max_idx >= 0):
             self.knot_list[self._idx].pop_point(count)
-            if(len(self.knot_list[self._idx].points)==0):
+            if(len(self.knot_list[self._idx]._point_array())==0):
                 self.pop_knot()
 
     def speed_up(self):
         if(self._max_idx >= 0):
-            self.knot_list[self._idx].speeds = [each_speed*2 
-                                                for each_speed in self.knot_list[self._idx].speeds]
+            self.knot_list[self._idx].scale_speeds(2)
 
     def speed_down(self):
         if(self._max_idx >= 0):
-            self.knot_list[self._idx].speeds = [each_speed*0.5 
-                                                for each_speed in self.knot_list[self._idx].speeds]
+            self.knot_list[self._idx].scale_speeds(0.5)
 
     def restart_display(self):
         self.knot_list = []
         self._max_idx = -1
         self._idx = -1
         self.display.fill((0, 0, 0))
+        self.invalidate()
 
-    def draw_help(self):
+    def draw_help(self, count):
         self.display.fill((50, 50, 50))
-        font1 = pygame.font.SysFont("courier", 24)
-        font2 = pygame.font.SysFont("serif", 24)
         data = []
         data.append(["F1", "Show Help"])
         data.append(["R", "Restart"])
@@ -245,24 +791,36 @@ class KnotDisplay(Knot):
 
         data.append(["Num*", "Speed up selected knot"])
         data.append(["Num/", "Speed down selected knot"])
+        data.append(["L", "Adaptive detail on/off"])
+        data.append(["F", "Cap/uncap frame rate"])
+        data.append(["F2", "Show frame stats"])
 
-        data.append([str(steps), "Current points"])
+        data.append([str(count), "Current points"])
         data.append([str(len(self.knot_list)), "Current number of knots"])
         data.append([str(self._idx + 1), "Knot #"])
-        data.append([str(len(self.knot_list[self._idx].points)), "Number of basepoints"])
+        data.append([str(len(self.knot_list[self._idx]._point_array())), "Number of basepoints"])
 
         pygame.draw.lines(self.display, (255, 50, 50, 255), True, [
                         (0, 0), (800, 0), (800, 600), (0, 600)], 5)
         for i, text in enumerate(data):
-            self.display.blit(font1.render(
-                text[0], True, (128, 128, 255)), (100, 100 + 30 * i))
-            self.display.blit(font2.render(
-                text[1], True, (128, 128, 255)), (200, 100 + 30 * i))
+            self.display.blit(self.text_cache.render(
+                text[0], ("courier", 24)), (100, 60 + 30 * i))
+            self.display.blit(self.text_cache.render(
+                text[1], ("serif", 24)), (200, 60 + 30 * i))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MyScreenSaver")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="compute knots in this many worker processes")
+    parser.add_argument("--record", metavar="PATH",
+                        help="record the session for knot_record.py to render later")
+    parser.add_argument("--profile-dump", metavar="PATH",
+                        help="collect frame timings and write them to PATH as CSV on exit")
+    args = parser.parse_args()
+
     pygame.init()
     gameDisplay = pygame.display.set_mode(SCREEN_DIM)
-    knot = Knot(display=gameDisplay)
+    knot = ArrayKnot(display=gameDisplay)
     pygame.display.set_caption("MyScreenSaver")
 
     steps = 35
@@ -275,9 +833,29 @@ if __name__ == "__main__":
     hue = 0
     color = pygame.Color(0)
 
-    knot_display = KnotDisplay(display=gameDisplay, new_knot=knot)
+    if args.workers > 0:
+        from knot_parallel import ParallelKnotDisplay
+        knot_display = ParallelKnotDisplay(display=gameDisplay, new_knot=knot,
+                                           workers=args.workers)
+    else:
+        knot_display = KnotDisplay(display=gameDisplay, new_knot=knot)
+    recorder = None
+    if args.record:
+        from knot_record import SessionWriter
+        recorder = SessionWriter(args.record)
+    lod = LevelOfDetail()
+    clock = pygame.time.Clock()
+    render_fps = RENDER_FPS
+    profiler = FrameProfiler(enabled=args.profile_dump is not None)
+    knot_display.profiler = profiler
+    show_stats = False
 
     while working:
+        frame_time = clock.tick(render_fps) / 1000
+        profiler.begin_frame()
+        if knot_display.lod is not None:
+            knot_display.lod.update(clock.get_rawtime() / 1000)
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 working = False
@@ -286,7 +864,7 @@ if __name__ == "__main__":
                     working = False
                 if event.key == pygame.K_r:
                     knot_display.restart_display()
-                    knot_display.add_knot(knot_to_add=Knot(gameDisplay))
+                    knot_display.add_knot(knot_to_add=ArrayKnot(gameDisplay))
                     pause = True
                 if event.key == pygame.K_p:
                     pause = not pause
@@ -294,38 +872,62 @@ if __name__ == "__main__":
                     steps += 1
                 if event.key == pygame.K_F1:
                     show_help = not show_help
+                    knot_display.invalidate()
+                if event.key == pygame.K_F2:
+                    show_stats = not show_stats
+                    profiler.enabled = show_stats or args.profile_dump is not None
+                    knot_display.invalidate()
                 if event.key == pygame.K_KP_MINUS:
                     steps -= 1 if steps > 1 else 0
 
                 if event.key == pygame.K_d:
                     knot_display.pop_point(count = steps)
                     if knot_display.get_max_idx() == -1:
-                        knot_display.add_knot(knot_to_add=Knot(gameDisplay))
+                        knot_display.add_knot(knot_to_add=ArrayKnot(gameDisplay))
                 if event.key == pygame.K_n:
                     knot_display.get_next_knot()
                 if event.key == pygame.K_DELETE:
                     knot_display.pop_knot()
                     if knot_display.get_max_idx() == -1:
-                        knot_display.add_knot(knot_to_add=Knot(gameDisplay))
+                        knot_display.add_knot(knot_to_add=ArrayKnot(gameDisplay))
                 if event.key == pygame.K_a:
-                    knot_display.add_knot(knot_to_add=Knot(gameDisplay))
+                    knot_display.add_knot(knot_to_add=ArrayKnot(gameDisplay))
                 if event.key == pygame.K_KP_MULTIPLY:
                     knot_display.speed_up()
                 if event.key == pygame.K_KP_DIVIDE:
                     knot_display.speed_down()
+                if event.key == pygame.K_l:
+                    knot_display.set_lod(None if knot_display.lod else lod)
+                if event.key == pygame.K_f:
+                    render_fps = 0 if render_fps else RENDER_FPS
                 
 
             if event.type == pygame.MOUSEBUTTONDOWN:
                 knot_display.add_point(event.pos, (random.random() * 2, random.random() * 2), count = steps)
 
-        knot_display.draw_all(count=steps)
+        profiler.mark("events")
         if not pause:
-            knot_display.set_all(count = steps)
+            knot_display.advance(frame_time, count=steps)
+        dirty_rects = knot_display.draw_all(count=steps)
+        if recorder is not None:
+            recorder.write_frame(knot_display.frame_state(), steps)
+        if show_stats:
+            dirty_rects.append(profiler.draw_overlay(gameDisplay, knot_display.text_cache))
+        profiler.mark("draw")
         if show_help:
-            knot_display.draw_help()
-
-        pygame.display.flip()
-
+            knot_display.draw_help(count=steps)
+            pygame.display.flip()
+        else:
+            pygame.display.update([rect for rect in dirty_rects if rect is not None])
+        profiler.mark("flip")
+        profiler.end_frame()
+
+    if recorder is not None:
+        recorder.close()
+    if args.profile_dump:
+        profiler.dump(args.profile_dump)
+    if args.workers > 0:
+        knot_display.close()
     pygame.display.quit()
     pygame.quit()
     exit(0)
\ No newline at end of file